@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import closing
+
+from django.db import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    A bounded pool of DB-API connections shared by the threads of one
+    worker process.
+
+    `acquire()` hands out the most recently returned idle connection,
+    opens a new one while fewer than `max_size` are open, or waits up
+    to `timeout` seconds for one to be released. Connections idle for
+    longer than `max_idle` or open for longer than `max_lifetime`
+    seconds are closed instead of reused; with `health_checks`, idle
+    connections are tested with `SELECT 1` before being handed out.
+    """
+    def __init__(self, max_size=10, timeout=5.0, max_idle=300, max_lifetime=1800, health_checks=True):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_checks = health_checks
+        self.condition = threading.Condition()
+        # (connection, opened at, returned at), most recently returned last
+        self.idle = deque()
+        # opened at, by id() of the connections handed out or idle
+        self.opened = {}
+        # connections being opened, counted against max_size
+        self.opening = 0
+        # tickets of the threads waiting for a connection
+        self.queue = deque()
+        self.counters = dict.fromkeys((
+            'acquired', 'created', 'reused', 'waited', 'timeouts', 'health_check_failures', 'expired',
+        ), 0)
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def is_expired(self, opened_at, returned_at, now):
+        return (
+            (self.max_lifetime is not None and now - opened_at >= self.max_lifetime)
+            or (self.max_idle is not None and now - returned_at >= self.max_idle)
+        )
+
+    def is_usable(self, connection):
+        try:
+            with closing(connection.cursor()) as cursor:
+                cursor.execute('SELECT 1')
+        except Exception:
+            return False
+        return True
+
+    def discard(self, connection):
+        with self.condition:
+            self.opened.pop(id(connection), None)
+            self.condition.notify_all()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def take(self, deadline):
+        """
+        Return an idle connection, or None after reserving a slot for a
+        new one, and whether it had to wait. Waiting threads are served
+        in arrival order, so a thread which releases a connection and
+        asks again at once cannot starve them.
+        """
+        ticket = object()
+        waited = False
+        with self.condition:
+            try:
+                while True:
+                    now = time.monotonic()
+                    while self.idle and self.is_expired(self.idle[0][1], self.idle[0][2], now):
+                        connection = self.idle.popleft()[0]
+                        del self.opened[id(connection)]
+                        self.counters['expired'] += 1
+                        connection.close()
+                    if not self.queue or self.queue[0] is ticket:
+                        if self.idle:
+                            return self.idle.pop()[0], waited
+                        if len(self.opened) + self.opening < self.max_size:
+                            self.opening += 1
+                            return None, waited
+
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.counters['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'No database connection available within {self.timeout}s, '
+                            f'all {self.max_size} are in use.'
+                        )
+                    if not waited:
+                        self.queue.append(ticket)
+                        waited = True
+                    self.condition.wait(remaining)
+            finally:
+                if waited:
+                    self.queue.remove(ticket)
+                    self.condition.notify_all()
+
+    def acquire(self, connect):
+        """Hand out a connection, opening new ones with `connect()`."""
+        start = time.monotonic()
+        waited = False
+        while True:
+            connection, slot_waited = self.take(start + self.timeout)
+            waited = waited or slot_waited
+            if connection is None:
+                connection = self.open(connect)
+                break
+            if not self.health_checks or self.is_usable(connection):
+                self.counters['reused'] += 1
+                break
+            self.counters['health_check_failures'] += 1
+            self.discard(connection)
+
+        wait_time = time.monotonic() - start if waited else 0.0
+        with self.condition:
+            self.counters['acquired'] += 1
+            self.counters['waited'] += waited
+            self.wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+        return connection
+
+    def open(self, connect):
+        connection = None
+        try:
+            connection = connect()
+        finally:
+            with self.condition:
+                self.opening -= 1
+                if connection is not None:
+                    self.opened[id(connection)] = time.monotonic()
+                    self.counters['created'] += 1
+                self.condition.notify_all()
+        return connection
+
+    def release(self, connection, reusable=True):
+        """Take a connection back; it is closed when unusable, expired or not from this pool."""
+        if reusable:
+            try:
+                connection.rollback()
+            except Exception:
+                reusable = False
+        with self.condition:
+            opened_at = self.opened.get(id(connection))
+            now = time.monotonic()
+            if reusable and opened_at is not None and not self.is_expired(opened_at, now, now):
+                self.idle.append((connection, opened_at, now))
+                self.condition.notify_all()
+                return
+        self.discard(connection)
+
+    def close(self):
+        """Close the idle connections, e.g. at shutdown."""
+        with self.condition:
+            idle, self.idle = self.idle, deque()
+            for connection, _, _ in idle:
+                del self.opened[id(connection)]
+        for connection, _, _ in idle:
+            connection.close()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'max_size': self.max_size,
+                'open': len(self.opened),
+                'idle': len(self.idle),
+                'in_use': len(self.opened) - len(self.idle),
+                **self.counters,
+                'wait_time': round(self.wait_time, 6),
+                'max_wait_time': round(self.max_wait_time, 6),
+            }
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(key, **options):
+    """
+    The pool of this process for `key`. A forked worker starts with
+    empty pools rather than sharing connections with its parent.
+    """
+    key = (os.getpid(), key)
+    with pools_lock:
+        if key not in pools:
+            pools[key] = ConnectionPool(**options)
+        return pools[key]
+
+
+def pool_stats():
+    """Statistics of the pools of this process, by database alias."""
+    with pools_lock:
+        return {alias: pool.stats() for (pid, (alias, _)), pool in pools.items() if pid == os.getpid()}
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Database backend mixin taking connections from a ConnectionPool
+    and returning them on close(), e.g. at the end of each request
+    when CONN_MAX_AGE is 0.
+
+    Pool options come from the POOL entry of the database settings:
+    MAX_SIZE, TIMEOUT, MAX_IDLE and MAX_LIFETIME. Idle connections are
+    health checked when CONN_HEALTH_CHECKS is on.
+    """
+    def get_pool(self, conn_params):
+        options = {key.lower(): value for key, value in self.settings_dict.get('POOL', {}).items()}
+        options.setdefault('health_checks', self.settings_dict['CONN_HEALTH_CHECKS'])
+        return get_pool((self.alias, repr(sorted(conn_params.items()))), **options)
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        return self.pool.acquire(lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params))
+
+    def _close(self):
+        if self.connection is not None:
+            self.pool.release(self.connection, reusable=not self.errors_occurred or self.is_usable())
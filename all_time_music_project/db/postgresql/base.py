@@ -0,0 +1,12 @@
+from django.db.backends.postgresql import base
+
+from all_time_music_project.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """PostgreSQL backend with pooled connections."""
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        # set by the parent only when the connection was opened, not reused
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+        return connection
@@ -0,0 +1,10 @@
+from django.db.backends.sqlite3 import base
+
+from all_time_music_project.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """
+    SQLite backend with pooled connections, a stand-in for the pooled
+    PostgreSQL backend in development and tests.
+    """
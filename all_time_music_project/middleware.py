@@ -0,0 +1,137 @@
+import gzip
+import io
+import re
+import secrets
+import time
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from all_time_music_project.routers import request_state
+
+accepts_gzip = re.compile(r'\bgzip\b')
+compressible_type = re.compile(
+    r'^(text/|application/(json|x-ndjson|javascript|xml|vnd\.oai\.openapi)|[^;]*\+(json|xml))'
+)
+json_type = re.compile(r'^(application/(json|x-ndjson)|[^;]*\+json)')
+
+
+def gzip_file(fileobj, level):
+    """
+    A GzipFile writing to `fileobj`. Its header carries a filename of
+    random length, up to GZIP_MAX_RANDOM_BYTES, so the length of a
+    response does not tell BREACH attacks how well input reflected into
+    a page compresses with the secrets in it, e.g. CSRF tokens.
+    """
+    max_random_bytes = getattr(settings, 'GZIP_MAX_RANDOM_BYTES', 100)
+    filename = b'a' * secrets.randbelow(max_random_bytes) if max_random_bytes else None
+    return gzip.GzipFile(filename=filename, mode='wb', compresslevel=level, fileobj=fileobj, mtime=0)
+
+
+def take(buffer):
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def compress_bytes(content, level):
+    buffer = io.BytesIO()
+    with gzip_file(buffer, level) as file:
+        file.write(content)
+    return buffer.getvalue()
+
+
+def compress_stream(chunks, level):
+    """
+    Gzip an iterable of chunks one chunk at a time. Every chunk is
+    flushed, so clients receive data as soon as the view yields it.
+    """
+    buffer = io.BytesIO()
+    with gzip_file(buffer, level) as file:
+        for chunk in chunks:
+            file.write(chunk)
+            file.flush()
+            data = take(buffer)
+            if data:
+                yield data
+    yield take(buffer)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Gzip text responses, including streaming ones, for clients which
+    accept it.
+
+    Responses shorter than GZIP_MIN_LENGTH are sent as they are, the
+    gzip framing would cost more than it saves. JSON responses of at
+    least GZIP_FAST_MIN_LENGTH bytes, and streamed JSON whose length is
+    unknown, use the cheaper GZIP_FAST_LEVEL; everything else uses
+    GZIP_LEVEL. Gzip headers are padded against BREACH, see `gzip_file`.
+    """
+    def get_level(self, response):
+        content_type = response.get('Content-Type', '')
+        if json_type.match(content_type) and (
+            response.streaming or len(response.content) >= getattr(settings, 'GZIP_FAST_MIN_LENGTH', 65536)
+        ):
+            return getattr(settings, 'GZIP_FAST_LEVEL', 1)
+        return getattr(settings, 'GZIP_LEVEL', 6)
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if not compressible_type.match(response.get('Content-Type', '')):
+            return response
+        if not response.streaming and len(response.content) < getattr(settings, 'GZIP_MIN_LENGTH', 1024):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            return response
+
+        level = self.get_level(response)
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, level)
+            del response.headers['Content-Length']
+        else:
+            compressed = compress_bytes(response.content, level)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # The compressed body is not byte for byte the entity the ETag was computed for.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+
+class ReplicaPinningMiddleware(MiddlewareMixin):
+    """
+    Keep a client's reads on the primary database for
+    REPLICA_PIN_SECONDS after a request of theirs wrote to it, so the
+    page they are redirected to shows what they have just saved. The
+    end of the window is kept in a cookie; see ReplicaRouter.
+    """
+    def cookie_name(self):
+        return getattr(settings, 'REPLICA_PIN_COOKIE', 'primary_until')
+
+    def process_request(self, request):
+        try:
+            pinned = float(request.COOKIES.get(self.cookie_name(), 0)) > time.time()
+        except ValueError:
+            pinned = False
+        request_state.set({'pinned': pinned, 'wrote': False})
+
+    def process_response(self, request, response):
+        state = request_state.get()
+        request_state.set(None)
+        if state is not None and state['wrote']:
+            seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+            response.set_cookie(
+                self.cookie_name(), str(time.time() + seconds), max_age=seconds, httponly=True, samesite='Lax'
+            )
+        return response
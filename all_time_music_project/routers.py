@@ -0,0 +1,64 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# {'pinned': reads go to the primary, 'wrote': the request wrote} of
+# the current request, set by ReplicaPinningMiddleware
+request_state = ContextVar('replica_request_state', default=None)
+primary_only = ContextVar('replica_primary_only', default=False)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block, e.g. before writing what was read."""
+    token = primary_only.set(True)
+    try:
+        yield
+    finally:
+        primary_only.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send writes to the primary database and reads to a randomly
+    chosen alias of DATABASE_REPLICAS.
+
+    Reads stay on the primary inside transactions, in `use_primary()`
+    blocks, for the rest of a request once it wrote, and for
+    REPLICA_PIN_SECONDS after a client's last write (see
+    ReplicaPinningMiddleware), so users read their own writes despite
+    replication lag.
+    """
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if not aliases or primary_only.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        state = request_state.get()
+        if state is not None and state['pinned']:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        state = request_state.get()
+        if state is not None:
+            state['pinned'] = state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary
+        if db in replicas():
+            return False
+        return None
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 import rest_framework.permissions
@@ -49,6 +50,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'all_time_music_project.middleware.CompressionMiddleware',
+    'all_time_music_project.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,6 +60,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Response compression, see all_time_music_project.middleware
+GZIP_MIN_LENGTH = 1024
+GZIP_LEVEL = 6
+GZIP_FAST_LEVEL = 1
+GZIP_FAST_MIN_LENGTH = 65536
+GZIP_MAX_RANDOM_BYTES = 100
+
 ROOT_URLCONF = 'all_time_music_project.urls'
 
 TEMPLATES = [
@@ -128,6 +138,60 @@ except ModuleNotFoundError:
     print("Complete data and try again!")
     exit(0)
 
+# Trigram lookups used by the PostgreSQL band search
+if DATABASES['default']['ENGINE'].startswith('django.db.backends.postgresql'):
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+# Persistent connections: kept for DATABASE_CONN_MAX_AGE seconds and
+# checked before reuse. With DATABASE_POOL_SIZE set, connections are
+# instead returned after every request to a pool of at most that many
+# per worker process; see all_time_music_project.db.pool
+POOLED_ENGINES = {
+    'django.db.backends.postgresql': 'all_time_music_project.db.postgresql',
+    'django.db.backends.sqlite3': 'all_time_music_project.db.sqlite3',
+}
+DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE') or 0)
+for database in DATABASES.values():
+    database.setdefault('CONN_HEALTH_CHECKS', True)
+    if DATABASE_POOL_SIZE and database['ENGINE'] in POOLED_ENGINES:
+        database['ENGINE'] = POOLED_ENGINES[database['ENGINE']]
+        database.setdefault('POOL', {
+            'MAX_SIZE': DATABASE_POOL_SIZE,
+            'TIMEOUT': float(os.environ.get('DATABASE_POOL_TIMEOUT') or 5),
+        })
+    else:
+        database.setdefault('CONN_MAX_AGE', int(os.environ.get('DATABASE_CONN_MAX_AGE') or 0))
+
+# Read replicas: every other alias of DATABASES is a replica of 'default'
+# and serves reads, except for REPLICA_PIN_SECONDS after a client wrote;
+# see all_time_music_project.routers
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias].setdefault('TEST', {}).setdefault('MIRROR', 'default')
+DATABASE_ROUTERS = ['all_time_music_project.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = 'primary_until'
+
+# Dotted path of the band search backend, chosen by database vendor when
+# not set; see music_app.search
+SEARCH_BACKEND = None
+SEARCH_MAX_RESULTS = 1000
+
+# Fields matching imported rows to existing ones by kind, e.g.
+# {'bands': ('name',)}, overriding those of music_app.importer.SPECS
+IMPORT_NATURAL_KEYS = {}
+
+# Labels and bands whose delete cascades to more than DELETE_SYNC_LIMIT
+# rows are hidden at once and deleted DELETE_CHUNK_SIZE rows per
+# transaction by a thread of the web process, or only by
+# `manage.py run_deletions` with DELETE_IN_THREAD off; see music_app.deletion.
+# Either way schedule `manage.py run_deletions` periodically, e.g. every
+# few minutes from cron: it is what finishes jobs whose thread died with
+# a restarted worker, which otherwise stay running and their rows hidden.
+DELETE_SYNC_LIMIT = 1000
+DELETE_CHUNK_SIZE = 500
+DELETE_IN_THREAD = True
+
 
 # REST FRAMEWORK
 
@@ -136,9 +200,58 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.KeysetPagination",
+    "DEFAULT_FILTER_BACKENDS": [
+        "api.filters.DeclarativeFilterBackend",
+        "api.filters.BatchIdsFilterBackend",
+    ],
+    "DEFAULT_THROTTLE_CLASSES": [
+        "api.throttling.UserThrottle",
+        "api.throttling.IPThrottle",
+    ],
+    "DEFAULT_THROTTLE_RATES": {
+        "user_read": "1200/min",
+        "user_write": "120/min",
+        "ip_read": "3000/min",
+        "ip_write": "300/min",
+    },
 
 }
 
+# Cursor pagination is used only when a client asks for it
+# with ?cursor= or ?page_size=
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+# Maximum number of objects accepted by a single bulk create request
+API_BULK_MAX_ITEMS = 1000
+
+# Maximum number of changed rows returned by one ?modified_since= request
+API_SYNC_PAGE_SIZE = 1000
+
+# Maximum number of objects requested at once with ?ids=
+API_BATCH_MAX_IDS = 100
+
+# Rows fetched per round-trip by the streaming NDJSON export
+API_EXPORT_CHUNK_SIZE = 2000
+
+# Cache used for rendered API list responses and their generation counters
+API_CACHE_ALIAS = 'default'
+API_CACHE_TIMEOUT = 300
+
+# Where API throttles keep their token buckets: LocalBucketStore for
+# a single process, CacheBucketStore to share them through a cache
+API_THROTTLE_STORE = 'api.throttling.LocalBucketStore'
+API_THROTTLE_CACHE_ALIAS = 'default'
+
+# Serve API reads with native async views (ASGI deployments only)
+API_ASYNC_VIEWS = os.environ.get('API_ASYNC_VIEWS') == '1'
+
+# Prebuilt OpenAPI schema written by `manage.py build_schema`, used
+# while API_SCHEMA_VERSION (or the digest of the sources) matches
+API_SCHEMA_FILE = BASE_DIR / 'schema.prebuilt.json'
+API_SCHEMA_VERSION = os.environ.get('API_SCHEMA_VERSION')
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "All Time Music API",
     "DESCRIPTION": "A music database",
@@ -0,0 +1,158 @@
+import math
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import exceptions
+
+from api import views
+from api.fastpath import fast_list_plan
+from api.filters import apply_filterset, filter_ids, parse_ids
+from api.mixins import batch_response_data, parse_field_selection
+
+
+class AsyncReadView(View):
+    """
+    Native async variant of a read-only API endpoint, for ASGI
+    deployments with API_ASYNC_VIEWS enabled.
+
+    GET requests read `.values()` rows with the async ORM and build the
+    same data as the sync view through the fast list path. Writes and
+    requests using features only the DRF view implements (pagination,
+    conditional requests, header authentication, the browsable API)
+    are handed to `sync_view`.
+    """
+    sync_view = None
+    json_dumps_params = {'ensure_ascii': False, 'separators': (',', ':')}
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # CSRF is enforced by the DRF view for session authenticated writes.
+        view.csrf_exempt = True
+        return view
+
+    def needs_sync_view(self, request):
+        return (
+            'cursor' in request.GET
+            or 'page_size' in request.GET
+            or 'format' in request.GET
+            or 'modified_since' in request.GET
+            or 'text/html' in request.headers.get('Accept', '')
+            or 'Authorization' in request.headers
+            or 'If-None-Match' in request.headers
+            or 'If-Modified-Since' in request.headers
+        )
+
+    async def delegate(self, request, *args, **kwargs):
+        return await sync_to_async(self.sync_view.as_view())(request, *args, **kwargs)
+
+    async def check_permissions(self, request):
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        for permission in self.sync_view().get_permissions():
+            if not permission.has_permission(request, self):
+                error = exceptions.PermissionDenied if is_authenticated else exceptions.NotAuthenticated
+                return self.json({'detail': error.default_detail}, status=403)
+        return None
+
+    def check_throttles(self, request):
+        waits = [
+            throttle.wait() for throttle in self.sync_view().get_throttles()
+            if not throttle.allow_request(request, self)
+        ]
+        if not waits:
+            return None
+        wait = math.ceil(max(waits))
+        response = self.json({'detail': exceptions.Throttled(wait).detail}, status=429)
+        response['Retry-After'] = str(wait)
+        return response
+
+    def json(self, data, status=200):
+        return JsonResponse(data, status=status, safe=False, json_dumps_params=self.json_dumps_params)
+
+    async def get(self, request, *args, **kwargs):
+        if self.needs_sync_view(request):
+            return await self.delegate(request, *args, **kwargs)
+
+        denied = await self.check_permissions(request)
+        if denied is None:
+            # throttle stores may block, e.g. CacheBucketStore on a database cache
+            denied = await sync_to_async(self.check_throttles)(request)
+        if denied is not None:
+            return denied
+
+        selection = parse_field_selection(request.GET)
+        try:
+            plan = fast_list_plan(self.sync_view.serializer_class, selection.get('fields'), selection.get('omit'))
+        except exceptions.ValidationError as exc:
+            return self.json(exc.detail, status=400)
+        if plan is None:
+            return await self.delegate(request, *args, **kwargs)
+
+        queryset = self.sync_view.queryset.all()
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        if 'pk' in kwargs:
+            row = await plan.values(queryset.filter(pk=kwargs['pk'])).afirst()
+            if row is None:
+                return self.json({'detail': exceptions.NotFound.default_detail}, status=404)
+            data = await plan.arender([row])
+            return self.json(data[0])
+
+        try:
+            queryset = apply_filterset(queryset, getattr(self.sync_view, 'filterset', None), request.GET)
+            ids = parse_ids(queryset.model, request.GET)
+        except exceptions.ValidationError as exc:
+            return self.json(exc.detail, status=400)
+        if ids is not None:
+            queryset = filter_ids(queryset, ids)
+        rows = [row async for row in plan.values(queryset)]
+        data = await plan.arender(rows)
+        if ids is not None:
+            data = batch_response_data(ids, [row[plan.pk] for row in rows], data)
+        return self.json(data)
+
+    async def post(self, request, *args, **kwargs):
+        return await self.delegate(request, *args, **kwargs)
+
+    put = patch = delete = options = post
+
+
+class GenreList(AsyncReadView):
+    sync_view = views.GenreList
+
+
+class GenreDetail(AsyncReadView):
+    sync_view = views.GenreDetail
+
+
+class LabelList(AsyncReadView):
+    sync_view = views.LabelList
+
+
+class LabelDetail(AsyncReadView):
+    sync_view = views.LabelDetail
+
+
+class BandList(AsyncReadView):
+    sync_view = views.BandList
+
+
+class BandDetail(AsyncReadView):
+    sync_view = views.BandDetail
+
+
+class AlbumList(AsyncReadView):
+    sync_view = views.AlbumList
+
+
+class AlbumDetail(AsyncReadView):
+    sync_view = views.AlbumDetail
+
+
+class ReviewList(AsyncReadView):
+    sync_view = views.ReviewList
+
+
+class ReviewDetail(AsyncReadView):
+    sync_view = views.ReviewDetail
@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def generation_key(model):
+    return f'api:generation:{model._meta.label_lower}'
+
+
+def generations(models):
+    """
+    Return current generation counters of the models. Counters start
+    from the current time, so a counter evicted from the cache never
+    comes back with a value that was used before.
+    """
+    cache = get_cache()
+    keys = [generation_key(model) for model in models]
+    current = cache.get_many(keys)
+    for key in keys:
+        if key not in current:
+            cache.add(key, time.time_ns(), timeout=None)
+            current[key] = cache.get(key)
+    return tuple(current[key] for key in keys)
+
+
+def bump_generation(model):
+    """
+    Invalidate cached responses which depend on the model. The counter
+    is bumped again after commit, so a response cached from data read
+    before the transaction committed is not served afterwards.
+    """
+    def bump():
+        cache = get_cache()
+        try:
+            cache.incr(generation_key(model))
+        except ValueError:
+            cache.add(generation_key(model), time.time_ns(), timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
@@ -0,0 +1,131 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+
+from api.serializers import ChoiceField, RelatedNamesField
+
+
+def identity(value):
+    return value
+
+
+class FastListPlan:
+    """
+    Build list responses straight from `.values()` rows.
+
+    Produces the same data as the serializer for every row, but without
+    model instances or per-row serializer work. Choice fields use
+    precomputed value -> label tables and many-related names are read
+    with one query for the whole page.
+    """
+    def __init__(self, model, fields):
+        self.model = model
+        self.pk = model._meta.pk.attname
+        # (field name, values() lookup or many-to-many field, converter or slug)
+        self.fields = fields
+
+    def values(self, queryset, *extra):
+        lookups = {self.pk, *extra}
+        lookups.update(lookup for _, lookup, _ in self.fields if isinstance(lookup, str))
+        return queryset.prefetch_related(None).values(*lookups)
+
+    def render(self, rows):
+        rows = list(rows)
+        related = {
+            name: self.related_names(field, slug, rows)
+            for name, field, slug in self.many_fields()
+        }
+        return self.build(rows, related)
+
+    async def arender(self, rows):
+        related = {}
+        for name, field, slug in self.many_fields():
+            related[name] = {}
+            async for pk, value in self.related_names_query(field, slug, rows):
+                related[name].setdefault(pk, []).append(value)
+        return self.build(rows, related)
+
+    def many_fields(self):
+        return [field for field in self.fields if not isinstance(field[1], str)]
+
+    def build(self, rows, related):
+        fields = []
+        for name, lookup, convert in self.fields:
+            if isinstance(lookup, str):
+                fields.append((name, lookup, convert))
+            else:
+                names = related[name]
+                fields.append((name, self.pk, lambda pk, names=names: names.get(pk, [])))
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, lookup, convert in fields:
+                value = row[lookup]
+                item[name] = None if value is None else convert(value)
+            data.append(item)
+        return data
+
+    def related_names_query(self, field, slug, rows):
+        through = field.remote_field.through
+        source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+        return through.objects.filter(
+            **{f'{source}_id__in': [row[self.pk] for row in rows]}
+        ).order_by(f'{target}_id').values_list(f'{source}_id', f'{target}__{slug}')
+
+    def related_names(self, field, slug, rows):
+        names = {}
+        for pk, name in self.related_names_query(field, slug, rows):
+            names.setdefault(pk, []).append(name)
+        return names
+
+
+def converter(field, model_field):
+    if isinstance(field, ChoiceField):
+        return dict(field._choices).__getitem__
+    if isinstance(field, serializers.CharField) and isinstance(model_field, (models.CharField, models.TextField)):
+        return identity
+    if isinstance(field, serializers.IntegerField) and isinstance(model_field, models.IntegerField):
+        return identity
+    return field.to_representation
+
+
+@lru_cache(maxsize=256)
+def fast_list_plan(serializer_class, fields=None, omit=None):
+    """
+    Return a FastListPlan for the serializer, or None when one of its
+    fields cannot be built from `.values()` rows.
+    """
+    serializer = serializer_class(fields=fields, omit=omit)
+    model = serializer_class.Meta.model
+    plan = []
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            return None
+
+        current = model
+        model_field = None
+        for position, attr in enumerate(field.source_attrs):
+            if model_field is not None and not model_field.is_relation:
+                return None
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                return None
+            if (model_field.many_to_many or model_field.one_to_many) and position:
+                return None
+            current = model_field.related_model
+
+        if isinstance(field, RelatedNamesField) and model_field.many_to_many:
+            plan.append((name, model_field, field.slug_field))
+        elif model_field.is_relation or isinstance(field, serializers.BaseSerializer):
+            return None
+        else:
+            plan.append((name, '__'.join(field.source_attrs), converter(field, model_field)))
+
+    return FastListPlan(model, plan)
@@ -0,0 +1,156 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Case, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+EXACT = ('exact',)
+RANGE = ('exact', 'gte', 'lte')
+
+
+class DeclarativeFilterBackend(BaseFilterBackend):
+    """
+    Filter list views by the whitelist declared in the view's `filterset`:
+
+        filterset = {
+            'formed_in': ('formed_in', RANGE),
+        }
+
+    maps the `formed_in`, `formed_in__gte` and `formed_in__lte` query
+    parameters to lookups on the `formed_in` model field. Related
+    objects are filtered by id and choice fields accept both values
+    and labels. Lookups or values which are not allowed are rejected.
+    """
+    def get_filterset(self, view):
+        return getattr(view, 'filterset', None) or {}
+
+    def filter_queryset(self, request, queryset, view):
+        return apply_filterset(queryset, self.get_filterset(view), request.query_params)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = []
+        for name, (field_name, lookups) in self.get_filterset(view).items():
+            for lookup in lookups:
+                parameters.append({
+                    'name': name if lookup == 'exact' else f'{name}__{lookup}',
+                    'required': False,
+                    'in': 'query',
+                    'schema': {'type': 'string'},
+                })
+        return parameters
+
+
+class BatchIdsFilterBackend(BaseFilterBackend):
+    """
+    Restrict list views to the objects requested with `?ids=1,5,9`,
+    ordered as in the request.
+    """
+    def filter_queryset(self, request, queryset, view):
+        ids = parse_ids(queryset.model, request.query_params)
+        if ids is None:
+            return queryset
+        return filter_ids(queryset, ids)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': 'ids',
+            'required': False,
+            'in': 'query',
+            'description': 'Comma separated ids of the objects to return, '
+                           f'at most {getattr(settings, "API_BATCH_MAX_IDS", 100)}.',
+            'schema': {'type': 'string'},
+        }]
+
+
+def to_python(field, raw):
+    if field.is_relation:
+        return field.target_field.to_python(raw)
+    if field.choices:
+        labels = {label: value for value, label in field.flatchoices}
+        if raw in labels:
+            return labels[raw]
+    return field.to_python(raw)
+
+
+def apply_filterset(queryset, filterset, params):
+    """Filter `queryset` by the query `params` allowed by `filterset`."""
+    if not filterset:
+        return queryset
+
+    filters = {}
+    errors = {}
+    for param, raw in params.items():
+        name, _, lookup = param.partition('__')
+        if name not in filterset:
+            continue
+        field_name, lookups = filterset[name]
+        lookup = lookup or 'exact'
+        if lookup not in lookups:
+            errors[param] = [f'Allowed lookups: {", ".join(lookups)}.']
+            continue
+        try:
+            value = to_python(queryset.model._meta.get_field(field_name), raw)
+        except DjangoValidationError as exc:
+            errors[param] = exc.messages
+            continue
+        filters[f'{field_name}__{lookup}'] = value
+
+    if errors:
+        raise ValidationError(errors)
+    return queryset.filter(**filters)
+
+
+def parse_ids(model, params, param='ids'):
+    """
+    Return the distinct primary keys listed in the `param` query
+    parameter in request order, or None when it is not given.
+    """
+    raw = params.get(param)
+    if raw is None:
+        return None
+
+    limit = getattr(settings, 'API_BATCH_MAX_IDS', 100)
+    ids = []
+    for value in raw.split(','):
+        if not value.strip():
+            continue
+        try:
+            pk = model._meta.pk.to_python(value.strip())
+        except DjangoValidationError as exc:
+            raise ValidationError({param: exc.messages})
+        if pk not in ids:
+            ids.append(pk)
+        if len(ids) > limit:
+            raise ValidationError({param: [f'Ensure there are no more than {limit} ids.']})
+    return ids
+
+
+def filter_ids(queryset, ids):
+    """Filter `queryset` to `ids`, ordered as in `ids`."""
+    if not ids:
+        return queryset.none()
+    position = Case(*[When(pk=pk, then=index) for index, pk in enumerate(ids)])
+    return queryset.filter(pk__in=ids).order_by(position)
+
+
+def parse_since(params, param='modified_since'):
+    """
+    Return the aware datetime given in the `param` query parameter as
+    ISO 8601 or a Unix timestamp, or None when it is not given.
+    """
+    raw = params.get(param)
+    if raw is None:
+        return None
+    try:
+        value = parse_datetime(raw.strip())
+        if value is None:
+            value = datetime.fromtimestamp(float(raw), tz=dt_timezone.utc)
+    except (ValueError, OverflowError):
+        raise ValidationError({param: ['Enter an ISO 8601 date and time or a Unix timestamp.']})
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.schema import code_version, generate_schema, write_schema_file
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate the OpenAPI schema into API_SCHEMA_FILE, so processes running '
+        'the same code serve it without introspecting the views.'
+    )
+
+    def handle(self, *args, **options):
+        path = write_schema_file(generate_schema())
+        self.stdout.write(f'Wrote {path} for code version {code_version()}')
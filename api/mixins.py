@@ -0,0 +1,401 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db import models
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.cache import generations, get_cache
+from api.fastpath import fast_list_plan
+from api.filters import parse_ids, parse_since
+from api.models import Tombstone
+from api.serializers import query_plan
+
+from music_app.conditional import set_validators, signature, validators
+
+
+def parse_field_selection(params, fields_param='fields', omit_param='omit'):
+    """Return serializer `fields`/`omit` arguments from query parameters."""
+    selection = {}
+    for key, param in (('fields', fields_param), ('omit', omit_param)):
+        value = params.get(param)
+        if value is not None:
+            selection[key] = tuple(sorted({name.strip() for name in value.split(',') if name.strip()}))
+    return selection
+
+
+class EagerLoadingMixin:
+    """
+    Apply the `select_related`/`prefetch_related` lookups declared by
+    the view's serializer to the view queryset.
+    """
+    def get_field_selection(self):
+        return {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(
+                queryset, **self.get_field_selection()
+            )
+        return queryset
+
+
+class SparseFieldsMixin(EagerLoadingMixin):
+    """
+    Let clients pick response fields with `?fields=id,name` or drop
+    them with `?omit=bio`. The selection also trims the SQL columns
+    loaded for the response.
+    """
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+
+    def get_field_selection(self):
+        if self.request.method not in SAFE_METHODS:
+            return {}
+        return parse_field_selection(self.request.query_params, self.fields_query_param, self.omit_query_param)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update(self.get_field_selection())
+        return super().get_serializer(*args, **kwargs)
+
+
+def has_modified(model):
+    try:
+        model._meta.get_field('modified')
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+class ConditionalListMixin:
+    """
+    Answer list requests with `304 Not Modified` when nothing in the
+    queryset, or in the relations the serializer reads, has been
+    modified or removed since the client's copy. Views of models
+    without a `modified` column are served as usual.
+
+    The ETag covers the generation counters of every model the
+    response is built from, so many-to-many changes and renames of
+    prefetched rows are seen. Cursor pages and delta sync pages are
+    validated by the counters alone: an aggregate over the whole
+    table would cost a full scan per page.
+    """
+    def get_modified_fields(self, queryset):
+        if not has_modified(queryset.model):
+            return None
+
+        fields = ['modified']
+        for path in queryset.query.select_related or {}:
+            related_model = queryset.model._meta.get_field(path).related_model
+            if has_modified(related_model):
+                fields.append(f'{path}__modified')
+        return fields
+
+    def get_validator_dependencies(self, queryset):
+        if hasattr(self, 'get_cache_dependencies'):
+            return self.get_cache_dependencies()
+        return [queryset.model]
+
+    def is_partial_list(self, request):
+        """Whether the response is a page or a set of changes rather than the whole queryset."""
+        if getattr(self, 'get_sync_since', None) and self.get_sync_since() is not None:
+            return True
+        is_requested = getattr(self.paginator, 'is_requested', None)
+        return bool(is_requested and is_requested(request))
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        modified_fields = self.get_modified_fields(queryset)
+        if modified_fields is None:
+            return super().list(request, *args, **kwargs)
+
+        signatures = []
+        if not self.is_partial_list(request):
+            signatures.append(signature(queryset, *modified_fields))
+        etag, last_modified = validators(
+            signatures,
+            vary=(
+                request.get_full_path(),
+                request.accepted_media_type,
+                generations(self.get_validator_dependencies(queryset)),
+            ),
+        )
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+
+class DeltaSyncMixin:
+    """
+    Answer `?modified_since=<timestamp>` list requests with the rows
+    modified after it, oldest first, and tombstones of the rows deleted
+    after it:
+
+        {"results": [...], "deleted": [{"id": 7, "deleted": "..."}],
+         "until": "...", "next": null}
+
+    At most API_SYNC_PAGE_SIZE changes, rows and tombstones together,
+    are returned at once, taken from both in order of time; `next`
+    links the rest of the changes and is null on the last page. Mirrors
+    keep `until` and send it as `modified_since` on their next run.
+
+    Rows count as modified when their many-to-many links change or a
+    row they embed by name is renamed, see api.signals.
+    """
+    since_query_param = 'modified_since'
+    after_query_param = 'after_id'
+    after_deleted_query_param = 'after_deleted'
+
+    def get_sync_since(self):
+        return parse_since(self.request.query_params, self.since_query_param)
+
+    def paginate_queryset(self, queryset):
+        if self.get_sync_since() is not None:
+            return None
+        return super().paginate_queryset(queryset)
+
+    def get_changed(self, model, field, param, since):
+        """
+        Q of rows whose `field` is after `since`, or equal to it and
+        whose pk is after the `param` query parameter of `next` links.
+        """
+        changed = Q(**{f'{field}__gt': since})
+        after = self.request.query_params.get(param)
+        if after is not None:
+            try:
+                changed |= Q(**{field: since, 'pk__gt': model._meta.pk.to_python(after)})
+            except DjangoValidationError as exc:
+                raise ValidationError({param: exc.messages})
+        return changed
+
+    def list(self, request, *args, **kwargs):
+        since = self.get_sync_since()
+        if since is None:
+            return super().list(request, *args, **kwargs)
+
+        model = self.get_serializer_class().Meta.model
+        if not has_modified(model):
+            raise ValidationError({self.since_query_param: ['Not supported for this resource.']})
+
+        page_size = getattr(settings, 'API_SYNC_PAGE_SIZE', 1000)
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            self.get_changed(model, 'modified', self.after_query_param, since)
+        ).order_by('modified', 'pk')
+        plan = self.get_fast_list_plan()
+        if plan is None:
+            objects = list(queryset[:page_size + 1])
+            positions = [(obj.modified, obj.pk) for obj in objects]
+        else:
+            rows = list(plan.values(queryset, 'modified')[:page_size + 1])
+            positions = [(row['modified'], row[plan.pk]) for row in rows]
+        tombstones = list(Tombstone.objects.filter(
+            self.get_changed(Tombstone, 'deleted', self.after_deleted_query_param, since),
+            model=model._meta.label_lower,
+        ).order_by('deleted', 'id').values_list('deleted', 'id', 'object_id')[:page_size + 1])
+
+        # Both streams in order of time, rows before tombstones of the same time.
+        changes = sorted(
+            [(modified, 0, pk) for modified, pk in positions] + [(when, 1, pk) for when, pk, _ in tombstones]
+        )
+        more = len(changes) > page_size
+        changes = changes[:page_size]
+        row_count = sum(1 for _, kind, _ in changes if kind == 0)
+        if plan is None:
+            results = self.get_serializer(objects[:row_count], many=True).data
+        else:
+            results = plan.render(rows[:row_count])
+        deleted = [
+            {'id': object_id, 'deleted': when} for when, _, object_id in tombstones[:len(changes) - row_count]
+        ]
+
+        until = max([since] + [when for when, _, _ in changes[-1:]])
+        next_url = None
+        if more:
+            when, kind, pk = changes[-1]
+            next_url = replace_query_param(request.build_absolute_uri(), self.since_query_param, when.isoformat())
+            # rows of the same time come first, so after a tombstone they were all returned
+            if kind == 0:
+                next_url = replace_query_param(next_url, self.after_query_param, pk)
+                next_url = replace_query_param(next_url, self.after_deleted_query_param, 0)
+            else:
+                next_url = remove_query_param(next_url, self.after_query_param)
+                next_url = replace_query_param(next_url, self.after_deleted_query_param, pk)
+        return Response({'results': results, 'deleted': deleted, 'until': until, 'next': next_url})
+
+
+def batch_response_data(ids, found, results):
+    found = set(found)
+    return {'results': results, 'missing': [pk for pk in ids if pk not in found]}
+
+
+class BatchRetrieveMixin:
+    """
+    Answer `?ids=1,5,9` list requests with the requested objects in
+    request order and the ids which were not found, unpaginated:
+
+        {"results": [...], "missing": [9]}
+
+    The ids are applied by BatchIdsFilterBackend, so all of them are
+    loaded with one query. Builds the rows with the fast list path of
+    FastListMixin when it can.
+    """
+    def get_batch_ids(self):
+        return parse_ids(self.get_serializer_class().Meta.model, self.request.query_params)
+
+    def paginate_queryset(self, queryset):
+        if self.get_batch_ids() is not None:
+            return None
+        return super().paginate_queryset(queryset)
+
+    def list(self, request, *args, **kwargs):
+        ids = self.get_batch_ids()
+        if ids is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        plan = self.get_fast_list_plan()
+        if plan is None:
+            objects = list(queryset)
+            found = [obj.pk for obj in objects]
+            results = self.get_serializer(objects, many=True).data
+        else:
+            rows = list(plan.values(queryset))
+            found = [row[plan.pk] for row in rows]
+            results = plan.render(rows)
+        return Response(batch_response_data(ids, found, results))
+
+
+class BulkCreateMixin:
+    """
+    Accept a JSON array on create and save all items in one batch.
+    Invalid payloads are rejected as a whole with a list of errors,
+    one entry per item.
+    """
+    def get_serializer(self, *args, **kwargs):
+        if isinstance(kwargs.get('data'), list):
+            kwargs['many'] = True
+            kwargs.setdefault('max_length', getattr(settings, 'API_BULK_MAX_ITEMS', 1000))
+        return super().get_serializer(*args, **kwargs)
+
+    def perform_create(self, serializer):
+        extra = {}
+        model = self.get_serializer_class().Meta.model
+        try:
+            model._meta.get_field('added_by')
+        except FieldDoesNotExist:
+            pass
+        else:
+            extra['added_by'] = self.request.user
+        serializer.save(**extra)
+
+
+class FastListMixin:
+    """
+    Serve list requests from `.values()` rows when the serializer
+    fields allow it, skipping model instances and per-row serializer
+    work. The response data is the same as the serializer's.
+    """
+    fast_list = True
+
+    def get_fast_list_plan(self):
+        if not self.fast_list:
+            return None
+        selection = self.get_field_selection()
+        return fast_list_plan(self.get_serializer_class(), selection.get('fields'), selection.get('omit'))
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_fast_list_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = ()
+        if self.paginator is not None and hasattr(self.paginator, 'get_ordering'):
+            ordering = [field.lstrip('-') for field in self.paginator.get_ordering(request, queryset, self)]
+        rows = plan.values(queryset, *ordering)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(plan.render(page))
+        return Response(plan.render(rows))
+
+
+class CachedListMixin:
+    """
+    Cache rendered JSON list responses. The cache key contains the
+    query string and generation counters of every model the response
+    is built from; the counters are bumped on writes (see api.signals),
+    so cached responses are never served after the data has changed.
+    """
+    cache_list = True
+
+    def get_cache_dependencies(self):
+        serializer_class = self.get_serializer_class()
+        model = serializer_class.Meta.model
+        select, prefetch, _ = query_plan(serializer_class)
+
+        dependencies = {model}
+        for path in select + prefetch:
+            current = model
+            for attr in path.split('__'):
+                field = current._meta.get_field(attr)
+                if isinstance(field, models.ManyToManyField):
+                    dependencies.add(field.remote_field.through)
+                elif field.many_to_many:
+                    dependencies.add(field.through)
+                current = field.related_model
+                dependencies.add(current)
+        return sorted(dependencies, key=lambda dependency: dependency._meta.label)
+
+    def get_cache_key(self, request):
+        if not self.cache_list or request.accepted_renderer.format != 'json':
+            return None
+        key = (
+            type(self).__name__,
+            request.get_full_path(),
+            generations(self.get_cache_dependencies()),
+        )
+        return 'api:list:' + md5(repr(key).encode()).hexdigest()
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        cached = get_cache().get(key) if key else None
+        if cached is None:
+            response = super().list(request, *args, **kwargs)
+            response.cache_key = key
+            return response
+
+        content, content_type, etag, last_modified = cached
+        response = get_conditional_response(
+            request, etag=etag, last_modified=parse_http_date_safe(last_modified or '')
+        )
+        if response is None:
+            response = HttpResponse(content, content_type=content_type)
+        if etag:
+            response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = last_modified
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(response, 'cache_key', None)
+        if key and response.status_code == 200:
+            response.render()
+            get_cache().set(key, (
+                response.content,
+                response['Content-Type'],
+                response.get('ETag'),
+                response.get('Last-Modified'),
+            ), getattr(settings, 'API_CACHE_TIMEOUT', 300))
+        return response
@@ -1,3 +1,19 @@
 from django.db import models
 
-# Create your models here.
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted row of a model served by the API, so mirrors
+    syncing with `?modified_since=` learn about deletes.
+    """
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    deleted = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'deleted'], name='tombstone_model_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}'
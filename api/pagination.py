@@ -0,0 +1,35 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Opt-in cursor pagination for API list views.
+
+    Responses stay unpaginated unless the client sends a `cursor` or
+    `page_size` query parameter. Pages are selected with a `WHERE` on the
+    ordering column instead of `OFFSET`, so deep pages cost the same as
+    the first one. Views choose the column with a `cursor_ordering`
+    attribute (`id` by default).
+    """
+    ordering = 'id'
+    page_size = getattr(settings, 'API_PAGE_SIZE', 100)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 1000)
+
+    def is_requested(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', self.ordering)
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
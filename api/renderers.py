@@ -0,0 +1,20 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline delimited JSON, one object per line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return self.render_line(data)
+
+    @staticmethod
+    def render_line(row):
+        return json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
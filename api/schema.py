@@ -0,0 +1,124 @@
+import json
+import threading
+from functools import lru_cache
+from hashlib import md5
+from pathlib import Path
+
+import django
+import drf_spectacular
+import rest_framework
+from django.apps import apps
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.views import SpectacularAPIView
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """
+    Version of the code the schema is generated from: the
+    API_SCHEMA_VERSION setting when set (e.g. a release tag), otherwise
+    a digest of the project's Python sources and library versions.
+    """
+    version = getattr(settings, 'API_SCHEMA_VERSION', None)
+    if version:
+        return version
+
+    base_dir = Path(settings.BASE_DIR)
+    roots = {Path(__import__(settings.ROOT_URLCONF).__file__).parent}
+    roots.update(Path(config.path) for config in apps.get_app_configs())
+    digest = md5(f'{django.__version__} {rest_framework.__version__} {drf_spectacular.__version__}'.encode())
+    for root in sorted(root for root in roots if base_dir in root.parents):
+        for source in sorted(root.rglob('*.py')):
+            digest.update(str(source.relative_to(base_dir)).encode())
+            digest.update(source.read_bytes())
+    return digest.hexdigest()
+
+
+def generate_schema():
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    return generator.get_schema(request=None, public=True)
+
+
+def schema_file():
+    return Path(getattr(settings, 'API_SCHEMA_FILE', Path(settings.BASE_DIR) / 'schema.prebuilt.json'))
+
+
+def write_schema_file(schema, path=None):
+    path = path or schema_file()
+    path.write_text(json.dumps({'version': code_version(), 'schema': schema}))
+    return path
+
+
+def read_schema_file():
+    """Return the prebuilt schema, or None when missing or built from other code."""
+    try:
+        prebuilt = json.loads(schema_file().read_text())
+    except (OSError, ValueError):
+        return None
+    if prebuilt.get('version') != code_version():
+        return None
+    return prebuilt['schema']
+
+
+class SchemaCache:
+    """
+    The OpenAPI schema of this process, rendered once per media type.
+    Taken from the prebuilt schema file when it was built from the
+    running code, generated on first use otherwise.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.schema = None
+        self.rendered = {}
+
+    def get_schema(self):
+        with self.lock:
+            if self.version != code_version():
+                self.schema = read_schema_file()
+                if self.schema is None:
+                    self.schema = generate_schema()
+                self.version = code_version()
+                self.rendered = {}
+            return self.schema
+
+    def render(self, renderer, media_type):
+        schema = self.get_schema()
+        key = (type(renderer), media_type)
+        if key not in self.rendered:
+            content = renderer.render(schema, media_type, {})
+            self.rendered[key] = content, quote_etag(md5(content).hexdigest())
+        return self.rendered[key]
+
+    def clear(self):
+        with self.lock:
+            self.version = None
+            self.schema = None
+            self.rendered = {}
+
+
+schema_cache = SchemaCache()
+
+
+class CachedSchemaView(SpectacularAPIView):
+    """
+    SpectacularAPIView serving the schema from memory with an ETag,
+    instead of introspecting every view on each request. Requests for
+    a translated or versioned schema are generated as before.
+    """
+    def get(self, request, *args, **kwargs):
+        if request.GET.get('lang') or request.GET.get('version') or self.custom_settings:
+            return super().get(request, *args, **kwargs)
+
+        renderer = request.accepted_renderer
+        content, etag = schema_cache.render(renderer, request.accepted_media_type)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type=f'{renderer.media_type}; charset={renderer.charset}')
+            response['Content-Disposition'] = f'inline; filename="{self._get_filename(request, None)}"'
+        response['ETag'] = etag
+        return response
@@ -1,6 +1,14 @@
+from functools import lru_cache
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 
+from api.cache import bump_generation
+
 from music_app.models import (
     Genre,
     Label,
@@ -14,9 +22,15 @@ from music_app.models import (
     ALBUM_TYPES,
     FORMAT_TYPES,
 )
+from music_app.counters import counted_state, update_counters
+from music_app.ratings import RATING_FIELDS
 
 
 class ChoiceField(serializers.ChoiceField):
+    def __init__(self, choices, **kwargs):
+        super().__init__(choices, **kwargs)
+        self.display_to_value = {val: key for key, val in self._choices.items()}
+
     def to_representation(self, obj):
         if obj == '' and self.allow_blank:
             return obj
@@ -26,22 +40,328 @@ class ChoiceField(serializers.ChoiceField):
         if data == '' and self.allow_blank:
             return ''
 
-        for key, val in self._choices.items():
-            if val == data:
-                return key
-        self.fail('invalid_choice', input=data)
+        try:
+            return self.display_to_value[data]
+        except (KeyError, TypeError):
+            self.fail('invalid_choice', input=data)
+
+
+class RelatedNamesField(serializers.ListField):
+    """
+    Many-related field read and written as a list of names,
+    e.g. `["rock", "heavy metal"]` for genres, in primary key order.
+    """
+    child = serializers.CharField()
+
+    def __init__(self, slug_field='name', **kwargs):
+        self.slug_field = slug_field
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        related = sorted(super().get_attribute(instance).all(), key=attrgetter('pk'))
+        return [getattr(obj, self.slug_field) for obj in related]
+
+
+def related_paths(serializer, model, prefix=''):
+    """
+    Return (select_related, prefetch_related) lookups needed to
+    serialize `model` instances without a query per row.
+    """
+    select, prefetch = set(), set()
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        current = model
+        path = []
+        many = False
+        for attr in field.source_attrs:
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                break
+            if not model_field.is_relation:
+                break
+            if model_field.many_to_many or model_field.one_to_many:
+                many = True
+            path.append(attr)
+            current = model_field.related_model
+
+        if isinstance(field, serializers.ManyRelatedField):
+            field = field.child_relation
+        if isinstance(field, serializers.ListSerializer):
+            field = field.child
+
+        # A plain primary key relation is served from the `<name>_id` column.
+        is_pk_only = (
+            isinstance(field, serializers.PrimaryKeyRelatedField)
+            and len(path) == 1
+            and not many
+        )
+        if not path or is_pk_only:
+            continue
+
+        lookup = prefix + '__'.join(path)
+        (prefetch if many else select).add(lookup)
+
+        if isinstance(field, serializers.Serializer):
+            nested_select, nested_prefetch = related_paths(field, current, lookup + '__')
+            if many:
+                prefetch |= nested_select | nested_prefetch
+            else:
+                select |= nested_select
+                prefetch |= nested_prefetch
+
+    return select, prefetch
+
+
+def column_paths(serializer, model):
+    """
+    Return the `.only()` lookups needed to serialize `model` instances,
+    or None when a field reads something that is not a model column.
+    """
+    columns = {model._meta.pk.name}
+
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*' or isinstance(field, serializers.Serializer):
+            return None
+
+        current = model
+        path = []
+        for attr in field.source_attrs:
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                return None
+            path.append(attr)
+            if model_field.many_to_many or model_field.one_to_many:
+                # Loaded by prefetch_related, which only needs the pk.
+                break
+            columns.add('__'.join(path))
+            if not model_field.is_relation:
+                break
+            current = model_field.related_model
+
+    return columns
+
+
+@lru_cache(maxsize=256)
+def query_plan(serializer_class, fields=None, omit=None):
+    serializer = serializer_class(fields=fields, omit=omit)
+    model = serializer_class.Meta.model
+    select, prefetch = related_paths(serializer, model)
+    columns = None
+    if fields is not None or omit is not None:
+        columns = column_paths(serializer, model)
+    return sorted(select), sorted(prefetch), columns and sorted(columns)
+
+
+def natural_keys(serializer):
+    """
+    Return {relation: (related model, lookup fields, many)} for writable
+    fields which refer to related rows by natural key, e.g. `band`
+    written as `band.name`.
+    """
+    model = serializer.Meta.model
+    keys = {}
+
+    for field in serializer._writable_fields:
+        attrs = field.source_attrs
+        try:
+            model_field = model._meta.get_field(attrs[0])
+        except FieldDoesNotExist:
+            continue
+        if not model_field.is_relation:
+            continue
+
+        if isinstance(field, RelatedNamesField):
+            keys[attrs[0]] = (model_field.related_model, (field.slug_field,), True)
+        elif len(attrs) == 2 and not model_field.many_to_many:
+            related_model, lookups, many = keys.get(attrs[0], (model_field.related_model, (), False))
+            keys[attrs[0]] = (related_model, lookups + (attrs[1],), many)
+
+    return keys
+
 
+def resolve_natural_keys(serializer, items):
+    """
+    Replace natural keys in validated `items` with related instances,
+    using a single query per related table. Return a list of errors,
+    one dict per item.
+    """
+    errors = [{} for _ in items]
 
-class GenreSerializer(serializers.ModelSerializer):
+    for relation, (related_model, lookups, many) in natural_keys(serializer).items():
+        def key_of(value):
+            if many:
+                return (value,)
+            return tuple(value.get(lookup) for lookup in lookups)
+
+        wanted = set()
+        for item in items:
+            if relation in item:
+                values = item[relation] if many else [item[relation]]
+                wanted.update(map(key_of, values))
+        if not wanted:
+            continue
+
+        found = {}
+        queryset = related_model._default_manager.filter(**{
+            f'{lookup}__in': {key[i] for key in wanted}
+            for i, lookup in enumerate(lookups)
+        })
+        for obj in queryset:
+            found.setdefault(tuple(getattr(obj, lookup) for lookup in lookups), []).append(obj)
+
+        name = related_model._meta.verbose_name
+        for item, item_errors in zip(items, errors):
+            if relation not in item:
+                continue
+            values = item[relation] if many else [item[relation]]
+            resolved = []
+            for value in values:
+                key = key_of(value)
+                matches = found.get(key, [])
+                display = ', '.join(str(part) for part in key)
+                if not matches:
+                    item_errors.setdefault(relation, []).append(f'{name} "{display}" does not exist.')
+                elif len(matches) > 1:
+                    item_errors.setdefault(relation, []).append(f'{name} "{display}" is ambiguous.')
+                else:
+                    resolved.append(matches[0])
+            if many:
+                item[relation] = resolved
+            elif resolved:
+                item[relation] = resolved[0]
+
+    return errors
+
+
+class BulkCreateListSerializer(serializers.ListSerializer):
+    """
+    Validate a list of objects in one pass and save them with
+    `bulk_create`, including rows of many-to-many through tables.
+    """
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        errors = resolve_natural_keys(self.child, items)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        many_to_many = [
+            field for field in model._meta.many_to_many
+            if field.remote_field.through._meta.auto_created
+        ]
+        names = {field.name for field in many_to_many}
+
+        with transaction.atomic():
+            instances = model._default_manager.bulk_create([
+                model(**{key: value for key, value in item.items() if key not in names})
+                for item in validated_data
+            ])
+            update_counters(model, added=instances)
+            for field in many_to_many:
+                through = field.remote_field.through
+                source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+                rows = through.objects.bulk_create([
+                    through(**{f'{source}_id': instance.pk, f'{target}_id': obj.pk})
+                    for instance, item in zip(instances, validated_data)
+                    for obj in item.get(field.name, ())
+                ])
+                update_counters(through, added=rows)
+
+        # bulk_create() sends no post_save signals.
+        bump_generation(model)
+        for field in many_to_many:
+            bump_generation(field.remote_field.through)
+
+        prefetch_related_objects(instances, *query_plan(type(self.child))[1])
+        return instances
+
+
+class CatalogSerializer(serializers.ModelSerializer):
+    """
+    Model serializer which knows which relations and columns its fields
+    read, derived from the declared `source=` paths and many-related
+    fields. Related objects are written by natural key, e.g. a band
+    name, and resolved with one query per related table.
+
+    Passing `fields` or `omit` limits the serializer to a subset of
+    its declared fields.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        omit = kwargs.pop('omit', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is None and omit is None:
+            return
+
+        requested = set(fields or ()) | set(omit or ())
+        unknown = requested - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({
+                'fields': f'Unknown field(s): {", ".join(sorted(unknown))}.'
+            })
+
+        for name in list(self.fields):
+            if (fields is not None and name not in fields) or name in (omit or ()):
+                self.fields.pop(name)
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, omit=None):
+        select, prefetch, columns = query_plan(cls, fields, omit)
+
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if columns:
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            instance = super().create(validated_data)
+            update_counters(type(instance), added=[instance])
+        return instance
+
+    def update(self, instance, validated_data):
+        counted = counted_state(instance)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            update_counters(type(instance), added=[instance], removed=[counted])
+        return instance
+
+    def validate(self, attrs):
+        # Bulk creates resolve natural keys of all items at once.
+        if not isinstance(self.parent, BulkCreateListSerializer):
+            errors = resolve_natural_keys(self, [attrs])[0]
+            if errors:
+                raise serializers.ValidationError(errors)
+        return attrs
+
+
+class GenreSerializer(CatalogSerializer):
     class Meta:
         fields = (
             'id',
             'name',
+            'band_count',
+            'album_count',
         )
+        read_only_fields = ('band_count', 'album_count')
         model = Genre
+        list_serializer_class = BulkCreateListSerializer
 
 
-class LabelSerializer(serializers.ModelSerializer):
+class LabelSerializer(CatalogSerializer):
     status = ChoiceField(choices=LABEL_STATUS)
 
     class Meta:
@@ -53,11 +373,14 @@ class LabelSerializer(serializers.ModelSerializer):
             'status',
             'styles',
             'founding_year',
+            'band_count',
         )
+        read_only_fields = ('band_count',)
         model = Label
+        list_serializer_class = BulkCreateListSerializer
 
 
-class MusicianSerializer(serializers.ModelSerializer):
+class MusicianSerializer(CatalogSerializer):
     class Meta:
         fields = (
             'id',
@@ -67,14 +390,17 @@ class MusicianSerializer(serializers.ModelSerializer):
             'died',
             'place_of_birth',
             'bio',
+            'band_count',
         )
+        read_only_fields = ('band_count',)
         model = Musician
+        list_serializer_class = BulkCreateListSerializer
 
 
-class BandSerializer(serializers.ModelSerializer):
+class BandSerializer(CatalogSerializer):
     status = ChoiceField(choices=BAND_STATUS)
     current_label = serializers.CharField(source='current_label.name')
-    genre = serializers.StringRelatedField(many=True)
+    genre = RelatedNamesField()
 
     class Meta:
         fields = (
@@ -89,16 +415,25 @@ class BandSerializer(serializers.ModelSerializer):
             'lyrical_themes',
             'bio',
             'current_label',
+            'album_count',
+            'rating_count',
+            'rating_sum',
+            'rating_mean',
+            'rating_min',
+            'rating_max',
+            'rating_histogram',
         )
+        read_only_fields = RATING_FIELDS + ('album_count',)
         model = Band
+        list_serializer_class = BulkCreateListSerializer
 
 
-class AlbumSerializer(serializers.ModelSerializer):
+class AlbumSerializer(CatalogSerializer):
     type = ChoiceField(choices=ALBUM_TYPES)
     format = ChoiceField(choices=FORMAT_TYPES)
     band = serializers.CharField(source='band.name')
     label = serializers.CharField(source='label.name')
-    genre = serializers.StringRelatedField(many=True)
+    genre = RelatedNamesField()
 
     class Meta:
         fields = (
@@ -111,11 +446,19 @@ class AlbumSerializer(serializers.ModelSerializer):
             'format',
             'band',
             'label',
+            'rating_count',
+            'rating_sum',
+            'rating_mean',
+            'rating_min',
+            'rating_max',
+            'rating_histogram',
         )
+        read_only_fields = RATING_FIELDS
         model = Album
+        list_serializer_class = BulkCreateListSerializer
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(CatalogSerializer):
     album = serializers.CharField(source='album.title')
     band = serializers.CharField(source='band.name')
     user = serializers.CharField(source='user.username')
@@ -133,7 +476,7 @@ class ReviewSerializer(serializers.ModelSerializer):
         model = Review
 
 
-class MusicianBandSerializer(serializers.ModelSerializer):
+class MusicianBandSerializer(CatalogSerializer):
     band = serializers.CharField(source='band.name')
     real_name = serializers.CharField(source='musician.full_name')
     nickname = serializers.CharField(source='musician.name')
@@ -151,7 +494,7 @@ class MusicianBandSerializer(serializers.ModelSerializer):
         model = MusicianBand
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(CatalogSerializer):
     class Meta:
         fields = (
             'id',
@@ -160,4 +503,33 @@ class UserSerializer(serializers.ModelSerializer):
             'last_name',
             'email',
         )
-        model = get_user_model()
\ No newline at end of file
+        model = get_user_model()
+
+
+class BandFullSerializer(BandSerializer):
+    """
+    Band with its lineup and discography embedded, read only. Built
+    from five queries: the band with its current label, its genres,
+    the lineup with musicians, the albums with labels and the genres
+    of all albums.
+    """
+    lineup = MusicianBandSerializer(source='musicianband_set', many=True, read_only=True, omit=('band',))
+    albums = AlbumSerializer(source='album_by', many=True, read_only=True, omit=('band',))
+
+    class Meta(BandSerializer.Meta):
+        fields = BandSerializer.Meta.fields + ('lineup', 'albums')
+        read_only_fields = fields
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, omit=None):
+        return queryset.select_related('current_label').prefetch_related(
+            'genre',
+            Prefetch(
+                'musicianband_set',
+                queryset=MusicianBand.objects.select_related('musician').order_by('year_from', 'id'),
+            ),
+            Prefetch(
+                'album_by',
+                queryset=Album.objects.select_related('label').prefetch_related('genre').order_by('release_date', 'id'),
+            ),
+        )
@@ -0,0 +1,128 @@
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.utils import timezone
+
+from api.cache import bump_generation
+from api.models import Tombstone
+from music_app.counters import counters_changed
+from music_app.deletion import defer_update
+
+# filled by connect(), see embedded_relations()
+EMBEDDED = {}
+
+
+def invalidate_on_write(sender, **kwargs):
+    bump_generation(sender)
+
+
+def invalidate_on_m2m_change(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_generation(sender)
+
+
+def invalidate_deleted(sender, rows):
+    bump_generation(sender)
+
+
+def invalidate_on_delete(sender, **kwargs):
+    defer_update(invalidate_deleted, sender, ())
+
+
+def create_tombstones(sender, pks):
+    Tombstone.objects.bulk_create([Tombstone(model=sender._meta.label_lower, object_id=pk) for pk in pks])
+
+
+def record_tombstone(sender, instance, **kwargs):
+    defer_update(create_tombstones, sender, [instance.pk])
+
+
+def touch(model, **lookups):
+    """Set `modified` of matching rows, so `?modified_since=` mirrors fetch them again."""
+    if model._base_manager.filter(**lookups).update(modified=timezone.now()):
+        bump_generation(model)
+
+
+def touch_m2m_owners(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Touch the rows whose many-to-many field changed, e.g. the band of
+    `band.genre.add()`, or the bands of `genre.band_set.add()`.
+    """
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            touch(type(instance), pk=instance.pk)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        touch(model, pk__in=pk_set)
+    elif action == 'pre_clear':
+        # afterwards nothing tells which rows were linked
+        for field in model._meta.many_to_many:
+            if field.remote_field.through is sender:
+                touch(model, **{field.name: instance.pk})
+
+
+def embedded_relations():
+    """
+    {model: [(dependent model, relation, fields)]} of rows the API
+    serializers embed by natural key, e.g. the label name of a band.
+    """
+    from api import serializers
+
+    relations = {}
+    for serializer_class in (
+        serializers.BandSerializer,
+        serializers.AlbumSerializer,
+        serializers.ReviewSerializer,
+        serializers.MusicianBandSerializer,
+    ):
+        dependent = serializer_class.Meta.model
+        for relation, (model, fields, _) in serializers.natural_keys(serializer_class()).items():
+            relations.setdefault(model, []).append((dependent, relation, fields))
+    return relations
+
+
+def remember_natural_key(sender, instance, update_fields=None, **kwargs):
+    fields = {field for _, _, names in EMBEDDED[sender] for field in names}
+    instance._embedded_key = None
+    if instance.pk is not None and (update_fields is None or fields & set(update_fields)):
+        instance._embedded_key = sender._base_manager.filter(pk=instance.pk).values(*sorted(fields)).first()
+
+
+def touch_embedding_rows(sender, instance, created, **kwargs):
+    """Touch rows embedding `instance` by a natural key which was just changed, e.g. bands of a renamed label."""
+    before = getattr(instance, '_embedded_key', None)
+    if created or before is None:
+        return
+    for dependent, relation, fields in EMBEDDED[sender]:
+        if any(before[field] != getattr(instance, field) for field in fields):
+            touch(dependent, **{relation: instance.pk})
+
+
+def connect():
+    """
+    Bump cache generations on writes to the models served by the API,
+    including bulk counter updates, and record tombstones of their
+    deleted rows. Touch `modified` of rows whose many-to-many links
+    changed or which embed a renamed row, so delta sync returns them.
+    """
+    models = [
+        *apps.get_app_config('music_app').get_models(include_auto_created=True),
+        get_user_model(),
+    ]
+    for model in models:
+        post_save.connect(invalidate_on_write, sender=model, dispatch_uid=f'api-cache-save-{model._meta.label}')
+        post_delete.connect(invalidate_on_delete, sender=model, dispatch_uid=f'api-cache-delete-{model._meta.label}')
+        if not model._meta.auto_created:
+            post_delete.connect(record_tombstone, sender=model, dispatch_uid=f'api-tombstone-{model._meta.label}')
+            counters_changed.connect(
+                invalidate_on_write, sender=model, dispatch_uid=f'api-cache-counters-{model._meta.label}'
+            )
+        if model._meta.auto_created:
+            m2m_changed.connect(
+                invalidate_on_m2m_change, sender=model, dispatch_uid=f'api-cache-m2m-{model._meta.label}'
+            )
+            m2m_changed.connect(touch_m2m_owners, sender=model, dispatch_uid=f'api-touch-m2m-{model._meta.label}')
+
+    EMBEDDED.update(embedded_relations())
+    for model in EMBEDDED:
+        pre_save.connect(remember_natural_key, sender=model, dispatch_uid=f'api-natural-key-{model._meta.label}')
+        post_save.connect(touch_embedding_rows, sender=model, dispatch_uid=f'api-touch-{model._meta.label}')
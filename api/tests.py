@@ -0,0 +1,983 @@
+import gzip
+import json
+import sqlite3
+import threading
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.utils import ConnectionHandler
+from rest_framework import serializers
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory
+from django.utils import timezone
+from rest_framework.test import APIClient
+from all_time_music_project.db.pool import ConnectionPool, PoolTimeout
+from all_time_music_project.middleware import ReplicaPinningMiddleware
+from all_time_music_project.routers import ReplicaRouter, request_state, use_primary
+from api import async_views
+from api.schema import read_schema_file, schema_cache
+from api.throttling import LocalBucketStore, get_store, take_token
+from api.fastpath import fast_list_plan
+from api.mixins import CachedListMixin, FastListMixin
+from api.pagination import KeysetPagination
+from api.serializers import (
+    AlbumSerializer,
+    BandSerializer,
+    MusicianBandSerializer,
+    ReviewSerializer,
+    related_paths,
+)
+from api.models import Tombstone
+from music_app.models import Genre, Band, Label, Album, Musician, MusicianBand, Review
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    get_store('api.throttling.LocalBucketStore').clear()
+
+
+@pytest.fixture
+def user():
+    user = User.objects.create_user(
+        username='czarek',
+        password='kola123',
+        first_name='Marek',
+        last_name='Jarmarek',
+        email='marko@o2.pl'
+    )
+    return user
+
+
+@pytest.fixture
+def admin():
+    admin = User.objects.create_superuser(
+        username='admin',
+        password='admin123',
+        email='admin@o2.pl'
+    )
+    return admin
+
+
+@pytest.fixture
+def client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def admin_client(admin):
+    client = APIClient()
+    client.force_authenticate(admin)
+    return client
+
+
+@pytest.fixture
+def genre():
+    genre = Genre.objects.create(
+        name='rock'
+    )
+    return genre
+
+
+@pytest.fixture
+def label(user):
+    label = Label.objects.create(
+        name='Sony Music Polska',
+        address='ul.Zajęcza, Warsaw',
+        country='Poland',
+        status=1,
+        styles='pop',
+        founding_year=1995,
+        added_by_id=user.id
+    )
+    return label
+
+
+@pytest.fixture
+def band(label, user, genre):
+    band = Band.objects.create(
+        name='Iron Maiden',
+        country_of_origin='Great Britain',
+        location='Leyton, London',
+        status=1,
+        formed_in=1975,
+        lyrical_themes='war, politics, life',
+        current_label=label,
+        bio='NWOBHM godfathers',
+        added_by_id=user.id,
+    )
+    band.genre.set([genre])
+    return band
+
+
+@pytest.fixture
+def album(user, band, genre, label):
+    album = Album.objects.create(
+        title='Black Album',
+        band=band,
+        type=3,
+        release_date='1990-06-04',
+        catalog_id='MET-203',
+        label=label,
+        format=2,
+        added_by_id=user.id
+    )
+    album.genre.set([genre])
+    return album
+
+
+@pytest.fixture
+def musician(user):
+    musician = Musician.objects.create(
+        name="Nergal",
+        full_name="Adam Darski",
+        place_of_birth='Danzig, Poland',
+        bio='founder of Behemoth',
+        added_by_id=user.id
+    )
+    return musician
+
+
+@pytest.fixture
+def musician_to_band(musician, band):
+    musician_to_band = MusicianBand.objects.create(
+        musician=musician,
+        band=band,
+        year_from=1999,
+        year_to=2010,
+        role='leading guitar, vocal'
+    )
+    return musician_to_band
+
+
+@pytest.fixture
+def review(user, album, band):
+    review = Review.objects.create(
+        subject='Oldschool still rules!',
+        album=album,
+        band=band,
+        rating=8.5,
+        description='great music for heavy metal maniacs',
+        user=user
+    )
+    return review
+
+
+@pytest.fixture
+def genres():
+    return Genre.objects.bulk_create(
+        [Genre(name=f'genre {i}') for i in range(5)]
+    )
+
+
+@pytest.mark.django_db
+def test_list_is_unpaginated_by_default(client, genres):
+    response = client.get('/api/v1/genres/')
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_walks_all_pages(client, genres):
+    response = client.get('/api/v1/genres/', {'page_size': 2})
+    data = response.json()
+    assert [row['name'] for row in data['results']] == ['genre 0', 'genre 1']
+    assert data['previous'] is None
+
+    names = [row['name'] for row in data['results']]
+    while data['next']:
+        data = client.get(data['next']).json()
+        names += [row['name'] for row in data['results']]
+    assert names == [genre.name for genre in genres]
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_page_size_is_capped(client, genres, monkeypatch):
+    monkeypatch.setattr(KeysetPagination, 'max_page_size', 3)
+    response = client.get('/api/v1/genres/', {'page_size': 100})
+    assert len(response.json()['results']) == 3
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_orders_albums_by_added(client, album):
+    response = client.get('/api/v1/albums/', {'page_size': 10})
+    assert response.json()['results'][0]['title'] == 'Black Album'
+
+
+def test_eager_loading_paths_from_serializer_fields():
+    assert AlbumSerializer.setup_eager_loading(Album.objects.all()).query.select_related == {
+        'band': {}, 'label': {}
+    }
+    assert related_paths(ReviewSerializer(), Review) == ({'album', 'band', 'user'}, set())
+    assert related_paths(BandSerializer(), Band) == ({'current_label'}, {'genre'})
+    assert related_paths(MusicianBandSerializer(), MusicianBand) == ({'band', 'musician'}, set())
+
+
+@pytest.mark.django_db
+def test_album_list_query_count_is_constant(client, album, django_assert_num_queries):
+    for i in range(10):
+        extra = Album.objects.create(
+            title=f'Album {i}',
+            band=album.band,
+            type=1,
+            catalog_id=f'CAT-{i}',
+            label=album.label,
+            format=1,
+            added_by=album.added_by
+        )
+        extra.genre.set(album.genre.all())
+
+    # validators aggregate, albums with band and label, genres
+    with django_assert_num_queries(3):
+        response = client.get('/api/v1/albums/')
+    assert len(response.json()) == 11
+    assert response.json()[0]['genre'] == ['rock']
+
+
+@pytest.mark.django_db
+def test_sparse_fieldset_trims_response_and_columns(client, band, django_assert_num_queries):
+    with django_assert_num_queries(2) as context:
+        response = client.get('/api/v1/bands/', {'fields': 'id,name'})
+    assert response.json() == [{'id': band.id, 'name': 'Iron Maiden'}]
+    assert all('bio' not in query['sql'] for query in context.captured_queries)
+
+
+@pytest.mark.django_db
+def test_sparse_fieldset_omit(client, album):
+    response = client.get('/api/v1/albums/', {'omit': 'genre,catalog_id,label,rating_histogram'})
+    assert set(response.json()[0]) == {
+        'id', 'title', 'type', 'release_date', 'format', 'band',
+        'rating_count', 'rating_sum', 'rating_mean', 'rating_min', 'rating_max',
+    }
+    assert response.json()[0]['band'] == 'Iron Maiden'
+
+
+@pytest.mark.django_db
+def test_sparse_fieldset_unknown_field(client, band):
+    response = client.get('/api/v1/bands/', {'fields': 'id,password'})
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_band_list_conditional_get(client, band):
+    response = client.get('/api/v1/bands/')
+    etag = response['ETag']
+    assert response['Last-Modified']
+
+    not_modified = client.get('/api/v1/bands/', HTTP_IF_NONE_MATCH=etag)
+    assert not_modified.status_code == 304
+
+    band.current_label.name = 'Nuclear Blast'
+    band.current_label.save()
+    response = client.get('/api/v1/bands/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.json()[0]['current_label'] == 'Nuclear Blast'
+
+
+@pytest.mark.django_db
+def test_list_without_modified_has_no_validators(admin_client):
+    response = admin_client.get('/api/v1/users/')
+    assert response.status_code == 200
+    assert 'ETag' not in response
+
+
+@pytest.mark.django_db
+def test_create_single_album_by_names(client, band, label, genre):
+    response = client.post('/api/v1/albums/', {
+        'title': 'Killers',
+        'genre': ['rock'],
+        'type': 'Full-length',
+        'release_date': '1981-02-02',
+        'catalog_id': 'EMC-3357',
+        'format': 'vinyl',
+        'band': 'Iron Maiden',
+        'label': 'Sony Music Polska',
+    }, format='json')
+    assert response.status_code == 201
+    album = Album.objects.get(title='Killers')
+    assert album.band == band
+    assert list(album.genre.all()) == [genre]
+    band.refresh_from_db()
+    genre.refresh_from_db()
+    assert band.album_count == genre.album_count == 1
+
+    album.delete()
+    band.refresh_from_db()
+    genre.refresh_from_db()
+    assert band.album_count == genre.album_count == 0
+
+
+@pytest.mark.django_db
+def test_bulk_create_albums(client, band, label, genre, django_assert_num_queries):
+    Genre.objects.create(name='heavy metal')
+    payload = [
+        {
+            'title': f'Album {i}',
+            'genre': ['rock', 'heavy metal'],
+            'type': 'Full-length',
+            'release_date': None,
+            'catalog_id': f'CAT-{i}',
+            'format': 'CD',
+            'band': 'Iron Maiden',
+            'label': 'Sony Music Polska',
+        }
+        for i in range(20)
+    ]
+    # band, label and genre lookups, savepoint, albums, band album
+    # counter, through rows, genre album counters, savepoint release,
+    # genres for the response
+    with django_assert_num_queries(10):
+        response = client.post('/api/v1/albums/', payload, format='json')
+    assert response.status_code == 201
+    assert len(response.json()) == 20
+    assert response.json()[0]['genre'] == ['rock', 'heavy metal']
+    assert Album.objects.filter(band=band).count() == 20
+    assert Album.genre.through.objects.count() == 40
+    band.refresh_from_db()
+    assert band.album_count == 20
+    assert list(Genre.objects.values_list('album_count', flat=True)) == [20, 20]
+
+
+@pytest.mark.django_db
+def test_bulk_create_reports_errors_per_item(client, label):
+    payload = [
+        {
+            'name': 'Behemoth',
+            'country_of_origin': 'Poland',
+            'location': 'Gdańsk',
+            'status': 'active',
+            'formed_in': 1991,
+            'ended_in': None,
+            'genre': [],
+            'lyrical_themes': 'occultism',
+            'bio': None,
+            'current_label': 'Sony Music Polska',
+        },
+        {
+            'name': 'Vader',
+            'country_of_origin': 'Poland',
+            'location': 'Olsztyn',
+            'status': 'active',
+            'formed_in': 1983,
+            'ended_in': None,
+            'genre': ['death metal'],
+            'lyrical_themes': 'war',
+            'bio': None,
+            'current_label': 'Nuclear Blast',
+        },
+    ]
+    response = client.post('/api/v1/bands/', payload, format='json')
+    assert response.status_code == 400
+    errors = response.json()
+    assert errors[0] == {}
+    assert set(errors[1]) == {'genre', 'current_label'}
+    assert not Band.objects.exists()
+
+
+@pytest.mark.django_db
+def test_export_streams_ndjson(client, album):
+    response = client.get('/api/v1/export/albums.ndjson')
+    assert response.status_code == 200
+    assert response.streaming
+    assert response['Content-Type'] == 'application/x-ndjson'
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    assert len(lines) == 1
+    row = json.loads(lines[0])
+    assert row['title'] == 'Black Album'
+    assert row['band_id'] == album.band_id
+    assert row['release_date'] == '1990-06-04'
+
+
+@pytest.mark.django_db
+def test_export_unknown_resource_and_admin_only(client, admin_client, review):
+    assert client.get('/api/v1/export/users.ndjson').status_code == 404
+    assert client.get('/api/v1/export/reviews.ndjson').status_code == 403
+    response = admin_client.get('/api/v1/export/reviews.ndjson')
+    assert json.loads(b''.join(response.streaming_content))['rating'] == '8.5'
+
+
+@pytest.fixture
+def catalog(user, label, genre, band, album, musician, musician_to_band, review):
+    metal = Genre.objects.create(name='heavy metal')
+    Album.objects.create(
+        title='Live After Death',
+        band=band,
+        type=8,
+        release_date=None,
+        catalog_id='EMI-LIVE',
+        label=label,
+        format=7,
+        added_by=user
+    ).genre.set([metal, genre])
+    Band.objects.create(
+        name='Kat',
+        country_of_origin='Poland',
+        location='Katowice',
+        status=3,
+        formed_in=1979,
+        ended_in=2004,
+        lyrical_themes='occultism',
+        current_label=label,
+        bio=None,
+        added_by=user,
+    )
+    Musician.objects.create(
+        name='Roman',
+        full_name='Roman Kostrzewski',
+        born='1960-04-29',
+        died='2022-02-08',
+        place_of_birth='Zabrze, Poland',
+        bio=None,
+        added_by=user
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', [
+    '/api/v1/genres/',
+    '/api/v1/labels/',
+    '/api/v1/musicians/',
+    '/api/v1/bands/',
+    '/api/v1/albums/',
+    '/api/v1/reviews/',
+    '/api/v1/musician-to-band/',
+    '/api/v1/users/',
+    '/api/v1/albums/?fields=title,genre,type',
+    '/api/v1/albums/?page_size=1',
+])
+def test_fast_list_is_byte_identical_to_serializer(admin_client, catalog, monkeypatch, url):
+    monkeypatch.setattr(CachedListMixin, 'cache_list', False)
+    fast = admin_client.get(url, HTTP_ACCEPT='application/json')
+    monkeypatch.setattr(FastListMixin, 'fast_list', False)
+    slow = admin_client.get(url, HTTP_ACCEPT='application/json')
+    assert fast.status_code == slow.status_code == 200
+    assert fast.content == slow.content
+
+
+def test_fast_list_plan_falls_back_for_unsupported_fields():
+    class AlbumWithMethodSerializer(AlbumSerializer):
+        summary = serializers.SerializerMethodField()
+
+        class Meta(AlbumSerializer.Meta):
+            fields = AlbumSerializer.Meta.fields + ('summary',)
+
+        def get_summary(self, obj):
+            return str(obj)
+
+    assert fast_list_plan(AlbumSerializer) is not None
+    assert fast_list_plan(AlbumWithMethodSerializer) is None
+
+
+@pytest.mark.django_db
+def test_list_cache_hit_runs_no_queries(client, album, django_assert_num_queries):
+    first = client.get('/api/v1/albums/')
+    with django_assert_num_queries(0):
+        second = client.get('/api/v1/albums/')
+    assert second.content == first.content
+    assert second['ETag'] == first['ETag']
+
+    with django_assert_num_queries(0):
+        not_modified = client.get('/api/v1/albums/', HTTP_IF_NONE_MATCH=first['ETag'])
+    assert not_modified.status_code == 304
+
+
+@pytest.mark.django_db
+def test_list_cache_invalidated_by_writes(client, album, genre):
+    client.get('/api/v1/albums/')
+
+    album.band.name = 'Maiden'
+    album.band.save()
+    assert client.get('/api/v1/albums/').json()[0]['band'] == 'Maiden'
+
+    album.genre.add(Genre.objects.create(name='metal'))
+    assert client.get('/api/v1/albums/').json()[0]['genre'] == ['rock', 'metal']
+
+    genre.delete()
+    assert client.get('/api/v1/albums/').json()[0]['genre'] == ['metal']
+
+
+@pytest.mark.django_db
+def test_list_cache_invalidated_by_bulk_create(client):
+    assert client.get('/api/v1/genres/').json() == []
+    client.post('/api/v1/genres/', [{'name': 'rock'}, {'name': 'jazz'}], format='json')
+    assert len(client.get('/api/v1/genres/').json()) == 2
+
+
+@pytest.mark.django_db
+def test_band_filters(client, catalog, genre, label):
+    names = lambda params: [row['name'] for row in client.get('/api/v1/bands/', params).json()]
+    assert names({'country_of_origin': 'Poland'}) == ['Kat']
+    assert names({'status': 'split-up'}) == ['Kat']
+    assert names({'status': 1}) == ['Iron Maiden']
+    assert names({'genre': genre.id}) == ['Iron Maiden']
+    assert names({'formed_in__gte': 1976, 'formed_in__lte': 1980}) == ['Kat']
+    assert names({'current_label': label.id}) == ['Iron Maiden', 'Kat']
+
+
+@pytest.mark.django_db
+def test_album_and_review_filters(admin_client, catalog, album):
+    titles = lambda params: [row['title'] for row in admin_client.get('/api/v1/albums/', params).json()]
+    assert titles({'type': 'Live album'}) == ['Live After Death']
+    assert titles({'release_format': 'vinyl'}) == ['Black Album']
+    assert titles({'release_date__lte': '1995-01-01', 'band': album.band_id}) == ['Black Album']
+
+    reviews = admin_client.get('/api/v1/reviews/', {'rating__gte': 8, 'album': album.id}).json()
+    assert [row['subject'] for row in reviews] == ['Oldschool still rules!']
+    assert admin_client.get('/api/v1/reviews/', {'rating__gte': 9}).json() == []
+
+
+@pytest.mark.django_db
+def test_filters_reject_unlisted_lookups_and_bad_values(client, band):
+    response = client.get('/api/v1/bands/', {'name__icontains': 'iron', 'formed_in__in': '1,2'})
+    assert response.status_code == 400
+    assert set(response.json()) == {'formed_in__in'}
+    assert client.get('/api/v1/bands/', {'formed_in__gte': 'soon'}).status_code == 400
+    assert client.get('/api/v1/bands/', {'genre': 'rock'}).status_code == 400
+
+
+def call_async_view(view_class, user, path, **kwargs):
+    request = AsyncRequestFactory().get(path, HTTP_ACCEPT='application/json')
+    request.user = user
+    request.session = {}
+    return async_to_sync(view_class.as_view())(request, **kwargs)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('view_class, path', [
+    (async_views.GenreList, '/api/v1/genres/'),
+    (async_views.LabelList, '/api/v1/labels/'),
+    (async_views.BandList, '/api/v1/bands/?status=active'),
+    (async_views.AlbumList, '/api/v1/albums/?omit=label'),
+    (async_views.ReviewList, '/api/v1/reviews/'),
+])
+def test_async_list_matches_sync_view(admin_client, admin, catalog, monkeypatch, view_class, path):
+    monkeypatch.setattr(CachedListMixin, 'cache_list', False)
+    response = call_async_view(view_class, admin, path)
+    assert response.status_code == 200
+    assert response.content == admin_client.get(path, HTTP_ACCEPT='application/json').content
+
+
+@pytest.mark.django_db
+def test_async_detail_and_permissions(client, user, album):
+    response = call_async_view(async_views.AlbumDetail, user, '/', pk=album.id)
+    assert response.content == client.get(f'/api/v1/albums/{album.id}/').content
+
+    assert call_async_view(async_views.AlbumDetail, user, '/', pk=0).status_code == 404
+    assert call_async_view(async_views.ReviewList, user, '/').status_code == 403
+    assert call_async_view(async_views.BandList, AnonymousUser(), '/').status_code == 403
+    assert call_async_view(async_views.BandList, user, '/?formed_in__in=1').status_code == 400
+
+
+@pytest.mark.django_db
+def test_async_view_throttles_with_a_database_cache(user, genres, settings):
+    settings.CACHES = {
+        **settings.CACHES,
+        'throttle': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'api_throttle'},
+    }
+    settings.API_THROTTLE_CACHE_ALIAS = 'throttle'
+    settings.API_THROTTLE_STORE = 'api.throttling.CacheBucketStore'
+    settings.REST_FRAMEWORK = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'user_read': '1/min'}}
+    call_command('createcachetable', 'api_throttle')
+    get_store.cache_clear()
+    try:
+        assert call_async_view(async_views.GenreList, user, '/api/v1/genres/').status_code == 200
+        response = call_async_view(async_views.GenreList, user, '/api/v1/genres/')
+        assert response.status_code == 429
+    finally:
+        get_store.cache_clear()
+
+
+@pytest.mark.django_db
+def test_async_view_delegates_pagination_to_sync_view(user, genres):
+    response = call_async_view(async_views.GenreList, user, '/api/v1/genres/?page_size=2')
+    response.render()
+    assert len(json.loads(response.content)['results']) == 2
+
+
+@pytest.mark.django_db
+def test_batch_retrieve_preserves_order_and_reports_missing(client, genres):
+    ids = [genres[2].id, genres[0].id, 0, genres[2].id]
+    response = client.get('/api/v1/genres/', {'ids': ','.join(map(str, ids)), 'fields': 'name'})
+    assert response.status_code == 200
+    assert response.json() == {
+        'results': [{'name': genres[2].name}, {'name': genres[0].name}],
+        'missing': [0],
+    }
+
+
+@pytest.mark.django_db
+def test_batch_retrieve_serializer_path_and_async_view(client, user, album, catalog, monkeypatch):
+    monkeypatch.setattr(CachedListMixin, 'cache_list', False)
+    path = f'/api/v1/albums/?ids={album.id},999'
+    sync_data = client.get(path).json()
+    assert [item['id'] for item in sync_data['results']] == [album.id]
+    assert sync_data['missing'] == [999]
+
+    monkeypatch.setattr(FastListMixin, 'fast_list', False)
+    assert client.get(path).json() == sync_data
+    assert json.loads(call_async_view(async_views.AlbumList, user, path).content) == sync_data
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('ids', ['1,x', ','.join(str(i) for i in range(1, 102))])
+def test_batch_retrieve_rejects_bad_or_too_many_ids(client, ids):
+    response = client.get('/api/v1/bands/', {'ids': ids})
+    assert response.status_code == 400
+    assert 'ids' in response.json()
+
+
+@pytest.mark.django_db
+def test_band_full_document(client, band, catalog, django_assert_num_queries):
+    client.get('/api/v1/genres/')
+    # three validator aggregates and five queries for the document
+    with django_assert_num_queries(8):
+        response = client.get(f'/api/v1/bands/{band.id}/full/')
+    assert response.status_code == 200
+    data = response.json()
+    assert data['name'] == band.name
+    assert data['current_label'] == band.current_label.name
+    assert [member['nickname'] for member in data['lineup']] == ['Nergal']
+    assert 'band' not in data['lineup'][0]
+    assert [album['title'] for album in data['albums']] == ['Live After Death', 'Black Album']
+    assert data['albums'][0]['genre'] == ['rock', 'heavy metal']
+
+    response = client.get(f'/api/v1/bands/{band.id}/full/', HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 304
+
+    Album.objects.filter(band=band).first().save()
+    response = client.get(f'/api/v1/bands/{band.id}/full/', HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 200
+    assert client.get('/api/v1/bands/0/full/').status_code == 404
+
+
+def test_take_token_refills_at_rate():
+    assert take_token(0, 0, 0.5, capacity=10, rate=1) == (0.5, 0.5)
+    assert take_token(0.5, 0, 3, capacity=10, rate=1) == (2.5, 0)
+    assert take_token(9, 0, 100, capacity=10, rate=1) == (9, 0)
+
+
+def test_local_bucket_store_prunes_at_most_once_per_interval(monkeypatch):
+    store = LocalBucketStore()
+    store.max_buckets = 3
+    pruned = []
+    monkeypatch.setattr(store, 'prune', pruned.append)
+    for number in range(10):
+        store.consume(f'client {number}', capacity=10, rate=1)
+    assert len(pruned) == 1
+
+    store.next_prune = 0
+    store.consume('client 0', capacity=10, rate=1)
+    assert len(pruned) == 2
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('store', ['api.throttling.LocalBucketStore', 'api.throttling.CacheBucketStore'])
+def test_token_bucket_throttles_reads_and_writes_separately(client, user, admin_client, settings, store):
+    settings.API_THROTTLE_STORE = store
+    settings.REST_FRAMEWORK = {
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {'user_read': '2/min', 'user_write': '1/min', 'ip_read': '3/min'},
+    }
+    assert client.get('/api/v1/genres/').status_code == 200
+    assert client.get('/api/v1/genres/').status_code == 200
+    response = client.get('/api/v1/genres/')
+    assert response.status_code == 429
+    assert 25 <= int(response['Retry-After']) <= 30
+
+    assert client.post('/api/v1/genres/', {'name': 'doom'}).status_code == 201
+    assert client.post('/api/v1/genres/', {'name': 'sludge'}).status_code == 429
+
+    # the IP budget is shared by every user behind the address
+    assert admin_client.get('/api/v1/genres/').status_code == 429
+    assert call_async_view(async_views.GenreList, user, '/api/v1/genres/').status_code == 429
+
+
+@pytest.fixture
+def fresh_schema(settings, tmp_path):
+    settings.API_SCHEMA_FILE = tmp_path / 'schema.prebuilt.json'
+    schema_cache.clear()
+    yield settings.API_SCHEMA_FILE
+    schema_cache.clear()
+
+
+@pytest.mark.django_db
+def test_schema_is_served_from_memory_with_etag(fresh_schema, monkeypatch):
+    client = APIClient()
+    expected = APIClient().get('/api/schema/?lang=en')
+    response = client.get('/api/schema/')
+    assert response.status_code == 200
+    assert response.content == expected.content
+    assert response['Content-Type'] == expected['Content-Type']
+
+    monkeypatch.setattr('api.schema.generate_schema', lambda: pytest.fail('schema regenerated'))
+    assert client.get('/api/schema/', HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+    json_response = client.get('/api/schema/', HTTP_ACCEPT='application/vnd.oai.openapi+json')
+    assert json.loads(json_response.content)['info']['title'] == 'All Time Music API'
+
+
+@pytest.mark.django_db
+def test_prebuilt_schema_file_is_used_for_the_same_code_version(fresh_schema, settings, monkeypatch):
+    call_command('build_schema', stdout=StringIO())
+    schema_cache.clear()
+    monkeypatch.setattr('api.schema.generate_schema', lambda: pytest.fail('schema regenerated'))
+    assert read_schema_file()['info']['title'] == 'All Time Music API'
+    assert APIClient().get('/api/schema/').status_code == 200
+
+    monkeypatch.setattr('api.schema.code_version', lambda: 'other')
+    assert read_schema_file() is None
+
+
+@pytest.mark.django_db
+def test_modified_since_returns_changes_and_tombstones(client, genres, settings):
+    settings.API_SYNC_PAGE_SIZE = 2
+    since = (Genre.objects.order_by('modified').first().modified - timedelta(seconds=1)).isoformat()
+    Genre.objects.filter(pk=genres[0].pk).update(modified=Genre.objects.order_by('modified').last().modified)
+    deleted_id = genres[1].id
+    genres[1].delete()
+
+    response = client.get('/api/v1/genres/', {'modified_since': since, 'fields': 'id'})
+    data = response.json()
+    expected = list(Genre.objects.order_by('modified', 'id').values('id'))
+    assert data['results'] == expected[:2]
+    assert data['deleted'] == []
+    assert data['next'] is not None
+
+    data = client.get(data['next']).json()
+    assert data['results'] == expected[2:4]
+    assert data['deleted'] == []
+    assert data['next'] is not None
+
+    data = client.get(data['next']).json()
+    assert data['results'] == []
+    assert [item['id'] for item in data['deleted']] == [deleted_id]
+    assert data['next'] is None
+
+    data = client.get('/api/v1/genres/', {'modified_since': data['until']}).json()
+    assert data['results'] == data['deleted'] == []
+
+
+@pytest.mark.django_db
+def test_modified_since_pages_tombstones_with_rows(client, genres, settings):
+    settings.API_SYNC_PAGE_SIZE = 2
+    Genre.objects.bulk_create([Genre(name=f'sludge {i}') for i in range(3)])
+    deleted_ids = sorted(genre.id for genre in genres[:4])
+    Genre.objects.filter(pk__in=deleted_ids).delete()
+    Tombstone.objects.create(model='music_app.band', object_id=1)
+    # rows and tombstones of one time, paged by id within it
+    when = timezone.now()
+    Genre.objects.update(modified=when)
+    Tombstone.objects.update(deleted=when)
+    since = (when - timedelta(seconds=1)).isoformat()
+    kept = list(Genre.objects.order_by('id').values_list('id', flat=True))
+
+    data = client.get('/api/v1/genres/', {'modified_since': since, 'fields': 'id'}).json()
+    results, deleted, pages = [], [], 1
+    while True:
+        assert len(data['results']) + len(data['deleted']) <= 2
+        results += [row['id'] for row in data['results']]
+        deleted += [item['id'] for item in data['deleted']]
+        if data['next'] is None:
+            break
+        data = client.get(data['next']).json()
+        pages += 1
+    assert results == kept
+    assert sorted(deleted) == deleted_ids
+    assert pages == (len(kept) + len(deleted_ids) + 1) // 2
+
+    data = client.get('/api/v1/genres/', {'modified_since': data['until']}).json()
+    assert data['results'] == data['deleted'] == []
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path', [
+    '/api/v1/genres/?modified_since=yesterday',
+    '/api/v1/genres/?modified_since=0&after_id=x',
+    '/api/v1/genres/?modified_since=0&after_deleted=x',
+    '/api/v1/users/?modified_since=0',
+])
+def test_modified_since_rejects_bad_requests(admin_client, path):
+    assert admin_client.get(path).status_code == 400
+
+
+@pytest.mark.django_db
+def test_compression_streams_and_skips_tiny_responses(client, genres, settings):
+    settings.GZIP_MIN_LENGTH = 200
+    Genre.objects.bulk_create([Genre(name=f'doom metal {i}') for i in range(50)])
+    plain = client.get('/api/v1/genres/')
+    response = client.get('/api/v1/genres/', HTTP_ACCEPT_ENCODING='gzip, br')
+    assert response['Content-Encoding'] == 'gzip'
+    assert response['Vary'].endswith('Accept-Encoding')
+    assert response['ETag'] == 'W/' + plain['ETag']
+    assert gzip.decompress(response.content) == plain.content
+    not_modified = client.get('/api/v1/genres/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+    assert not_modified.status_code == 304
+
+    response = client.get('/api/v1/export/genres.ndjson', HTTP_ACCEPT_ENCODING='gzip')
+    assert response.streaming
+    assert response['Content-Encoding'] == 'gzip'
+    assert len(gzip.decompress(b''.join(response.streaming_content)).splitlines()) == 55
+
+    response = client.get('/api/v1/genres/', {'ids': genres[0].id}, HTTP_ACCEPT_ENCODING='gzip')
+    assert 'Content-Encoding' not in response
+
+
+@pytest.mark.django_db
+def test_compressed_length_is_padded_at_random(client, genres, settings):
+    settings.GZIP_MIN_LENGTH = 200
+    plain = client.get('/api/v1/genres/')
+    responses = [client.get('/api/v1/genres/', HTTP_ACCEPT_ENCODING='gzip') for _ in range(10)]
+    assert all(gzip.decompress(response.content) == plain.content for response in responses)
+    assert len({len(response.content) for response in responses}) > 1
+
+    settings.GZIP_MAX_RANDOM_BYTES = 0
+    assert len({len(client.get('/api/v1/genres/', HTTP_ACCEPT_ENCODING='gzip').content) for _ in range(3)}) == 1
+
+
+def test_connection_pool_bounds_and_reuses_connections():
+    pool = ConnectionPool(max_size=2, timeout=0.05)
+    connect = lambda: sqlite3.connect(':memory:', check_same_thread=False)  # noqa: E731
+    first, second = pool.acquire(connect), pool.acquire(connect)
+    with pytest.raises(PoolTimeout):
+        pool.acquire(connect)
+
+    pool.release(first)
+    assert pool.acquire(connect) is first
+    threading.Timer(0.01, pool.release, [second]).start()
+    assert pool.acquire(connect) is second
+
+    pool.release(first)
+    pool.release(second)
+    second.close()
+    assert pool.acquire(connect) is first
+    stats = pool.stats()
+    assert (stats['open'], stats['in_use'], stats['created'], stats['reused']) == (1, 1, 2, 3)
+    assert (stats['timeouts'], stats['waited'], stats['health_check_failures']) == (1, 1, 1)
+    assert stats['max_wait_time'] > 0
+
+
+def test_connection_pool_closes_expired_connections():
+    pool = ConnectionPool(max_size=1, max_lifetime=0)
+    connection = pool.acquire(lambda: sqlite3.connect(':memory:'))
+    pool.release(connection)
+    assert pool.stats()['open'] == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.execute('SELECT 1')
+
+
+@pytest.mark.django_db
+def test_pooled_backend_returns_connections_on_close(tmp_path, admin_client):
+    handler = ConnectionHandler({'default': {}, 'pooled': {
+        'ENGINE': 'all_time_music_project.db.sqlite3',
+        'NAME': str(tmp_path / 'pooled.sqlite3'),
+        'POOL': {'MAX_SIZE': 1},
+    }})
+    connection = handler['pooled']
+    connection.ensure_connection()
+    raw = connection.connection
+    connection.close()
+    connection.ensure_connection()
+    assert connection.connection is raw
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        assert cursor.fetchone() == (1,)
+    connection.close()
+    assert connection.pool.stats()['reused'] == 1
+
+    stats = admin_client.get('/api/v1/db-pool/').json()
+    assert stats['pooled']['idle'] == 1
+    connection.pool.close()
+
+
+def test_replica_router_pins_reads_after_writes(settings):
+    settings.DATABASE_REPLICAS = ['replica']
+    router = ReplicaRouter()
+    assert router.db_for_read(Band) == 'replica'
+    with use_primary():
+        assert router.db_for_read(Band) == 'default'
+    assert router.allow_migrate('replica', 'music_app') is False
+
+    routed = []
+
+    def view(request):
+        routed.append(router.db_for_read(Band))
+        routed.append(router.db_for_write(Band))
+        routed.append(router.db_for_read(Band))
+        return HttpResponse()
+
+    middleware = ReplicaPinningMiddleware(view)
+    response = middleware(RequestFactory().get('/'))
+    assert routed == ['replica', 'default', 'default']
+    assert request_state.get() is None
+    cookie = response.cookies['primary_until']
+
+    routed.clear()
+    middleware(RequestFactory(HTTP_COOKIE=f'primary_until={cookie.value}').get('/'))
+    assert routed[0] == 'default'
+
+    routed.clear()
+    middleware(RequestFactory(HTTP_COOKIE='primary_until=1').get('/'))
+    assert routed[0] == 'replica'
+
+
+@pytest.mark.django_db
+def test_list_etag_follows_relations_and_pages_skip_aggregate(client, band, genre):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    etag = client.get('/api/v1/bands/')['ETag']
+    band.genre.add(Genre.objects.create(name='metal'))
+    response = client.get('/api/v1/bands/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.json()[0]['genre'] == ['rock', 'metal']
+
+    etag = response['ETag']
+    genre.name = 'hard rock'
+    genre.save()
+    response = client.get('/api/v1/bands/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.json()[0]['genre'] == ['hard rock', 'metal']
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get('/api/v1/bands/', {'page_size': 10})
+    assert not any('MAX(' in query['sql'] for query in queries.captured_queries)
+    assert client.get('/api/v1/bands/', {'page_size': 10}, HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+
+
+@pytest.mark.django_db
+def test_modified_since_returns_rows_with_changed_links_and_embedded_names(client, band, label):
+    other = Genre.objects.create(name='metal')
+    since = timezone.now().isoformat()
+    band.genre.add(other)
+    data = client.get('/api/v1/bands/', {'modified_since': since}).json()
+    assert [item['genre'] for item in data['results']] == [['rock', 'metal']]
+
+    since = data['until']
+    other.band_set.remove(band)
+    assert client.get('/api/v1/bands/', {'modified_since': since}).json()['results'][0]['genre'] == ['rock']
+
+    since = timezone.now().isoformat()
+    label.name = 'Nuclear Blast'
+    label.save()
+    data = client.get('/api/v1/bands/', {'modified_since': since}).json()
+    assert [item['current_label'] for item in data['results']] == ['Nuclear Blast']
+
+    since = data['until']
+    label.styles = 'thrash'
+    label.save()
+    assert client.get('/api/v1/bands/', {'modified_since': since}).json()['results'] == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rebuild_commands_read_from_the_primary(settings, album):
+    # an unknown alias fails every read routed to a replica
+    settings.DATABASE_REPLICAS = ['replica']
+    call_command('rebuild_counters', stdout=StringIO())
+    call_command('rebuild_ratings', stdout=StringIO())
+    assert Band.objects.using('default').get().album_count == 1
@@ -0,0 +1,145 @@
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """Return (capacity, tokens per second) of a rate like '600/min'."""
+    num, period = rate.split('/')
+    num = int(num)
+    return num, num / DURATIONS[period[0]]
+
+
+def take_token(tokens, updated, now, capacity, rate):
+    """
+    Refill a bucket holding `tokens` at `updated` up to `now` and take
+    one token. Returns (tokens left, seconds to wait); the token is
+    taken only when the wait is 0.
+    """
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / rate
+
+
+class LocalBucketStore:
+    """
+    Token buckets kept in process memory. Fast and exact, but every
+    worker process has its own buckets, so use it for a single node.
+
+    Past `max_buckets`, refilled buckets are pruned at most once per
+    `prune_interval` seconds, so a flood of clients which all still
+    hold tokens does not make every request scan all buckets.
+    """
+    max_buckets = 10000
+    prune_interval = 1
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.next_prune = 0
+
+    def consume(self, key, capacity, rate):
+        with self.lock:
+            now = time.monotonic()
+            tokens, updated, _ = self.buckets.get(key, (capacity, now, now))
+            tokens, wait = take_token(tokens, updated, now, capacity, rate)
+            self.buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            if len(self.buckets) > self.max_buckets and now >= self.next_prune:
+                self.prune(now)
+                self.next_prune = now + self.prune_interval
+        return wait
+
+    def prune(self, now):
+        # A bucket which has refilled completely is the same as no bucket.
+        for key in [key for key, (_, _, full_at) in self.buckets.items() if full_at <= now]:
+            del self.buckets[key]
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Token buckets kept in the Django cache selected by
+    API_THROTTLE_CACHE_ALIAS, shared by all workers using that cache.
+    A bucket costs one `get` and one `set`; concurrent requests for the
+    same bucket may both take the last token.
+    """
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'API_THROTTLE_CACHE_ALIAS', 'default')]
+
+    def consume(self, key, capacity, rate):
+        key = f'api:throttle:{key}'
+        now = time.time()
+        tokens, updated = self.cache.get(key) or (capacity, now)
+        tokens, wait = take_token(tokens, updated, now, capacity, rate)
+        self.cache.set(key, (tokens, now), timeout=int((capacity - tokens) / rate) + 1)
+        return wait
+
+    def clear(self):
+        pass
+
+
+@lru_cache(maxsize=None)
+def get_store(path):
+    return import_string(path)()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket throttle with separate read and write budgets.
+
+    Rates come from the REST_FRAMEWORK `DEFAULT_THROTTLE_RATES` entries
+    `<scope>_read` and `<scope>_write`, e.g. `'user_read': '600/min'`
+    allows bursts of 600 reads refilled at 10 per second. A missing
+    rate disables that budget. Buckets live in the API_THROTTLE_STORE.
+    """
+    scope = None
+
+    def get_ident_key(self, request):
+        raise NotImplementedError('.get_ident_key() must be overridden')
+
+    def allow_request(self, request, view):
+        kind = 'read' if request.method in SAFE_METHODS else 'write'
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(f'{self.scope}_{kind}')
+        self.wait_time = 0
+        if rate is None:
+            return True
+
+        capacity, tokens_per_second = parse_rate(rate)
+        store = get_store(getattr(settings, 'API_THROTTLE_STORE', 'api.throttling.LocalBucketStore'))
+        key = f'{self.scope}:{kind}:{self.get_ident_key(request)}'
+        self.wait_time = store.consume(key, capacity, tokens_per_second)
+        return self.wait_time == 0
+
+    def wait(self):
+        return self.wait_time
+
+
+class UserThrottle(TokenBucketThrottle):
+    """Budget per authenticated user, per IP address for anonymous requests."""
+    scope = 'user'
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return self.get_ident(request)
+
+
+class IPThrottle(TokenBucketThrottle):
+    """Budget per client IP address, shared by all users behind it."""
+    scope = 'ip'
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
@@ -1,15 +1,28 @@
+from django.conf import settings
 from django.urls import path
 from api import views as v
 
+if getattr(settings, 'API_ASYNC_VIEWS', False):
+    from api import async_views as read
+else:
+    read = v
+
 
 urlpatterns = [
-    path("genres/", v.GenreList.as_view(), name="api-genre-list"),
-    path("genres/<int:pk>/", v.GenreDetail.as_view(), name="api-genre-detail"),
-    path("labels/", v.LabelList.as_view(), name="api-label-list"),
+    path("genres/", read.GenreList.as_view(), name="api-genre-list"),
+    path("genres/<int:pk>/", read.GenreDetail.as_view(), name="api-genre-detail"),
+    path("labels/", read.LabelList.as_view(), name="api-label-list"),
+    path("labels/<int:pk>/", read.LabelDetail.as_view(), name="api-label-detail"),
     path("musicians/", v.MusicianList.as_view(), name="api-musicians-list"),
-    path("bands/", v.BandList.as_view(), name="api-bands-list"),
-    path("albums/", v.AlbumList.as_view(), name="api-albums-list"),
-    path("reviews/", v.ReviewList.as_view(), name="api-reviews-list"),
+    path("bands/", read.BandList.as_view(), name="api-bands-list"),
+    path("bands/<int:pk>/", read.BandDetail.as_view(), name="api-band-detail"),
+    path("bands/<int:pk>/full/", v.BandFull.as_view(), name="api-band-full"),
+    path("albums/", read.AlbumList.as_view(), name="api-albums-list"),
+    path("albums/<int:pk>/", read.AlbumDetail.as_view(), name="api-album-detail"),
+    path("reviews/", read.ReviewList.as_view(), name="api-reviews-list"),
+    path("reviews/<int:pk>/", read.ReviewDetail.as_view(), name="api-review-detail"),
     path("musician-to-band/", v.MusicianBandList.as_view(), name='api-musician-band-list'),
     path("users/", v.UserList.as_view(), name='api-users-list'),
+    path("export/<str:resource>.ndjson", v.CatalogExport.as_view(), name='api-export'),
+    path("db-pool/", v.DatabasePoolStats.as_view(), name='api-db-pool'),
 ]
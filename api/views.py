@@ -1,17 +1,40 @@
-from rest_framework import generics, permissions
+from django.conf import settings
 from django.contrib.auth import get_user_model
-
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework import generics, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from all_time_music_project.db.pool import pool_stats
+from api.cache import generations
+from api.filters import EXACT, RANGE
+from api.mixins import (
+    BatchRetrieveMixin,
+    BulkCreateMixin,
+    CachedListMixin,
+    ConditionalListMixin,
+    DeltaSyncMixin,
+    EagerLoadingMixin,
+    FastListMixin,
+    SparseFieldsMixin,
+)
+from api.renderers import NDJSONRenderer
 from api.serializers import (
     GenreSerializer,
     LabelSerializer,
     MusicianSerializer,
     BandSerializer,
+    BandFullSerializer,
     AlbumSerializer,
     ReviewSerializer,
     MusicianBandSerializer,
     UserSerializer,
 )
 
+from music_app.conditional import set_validators, signature, validators
+from music_app.ratings import review_ratings, update_ratings
 from music_app.models import (
     Genre,
     Label,
@@ -23,49 +46,208 @@ from music_app.models import (
 )
 
 
-class GenreList(generics.ListCreateAPIView):
+class CatalogListView(BulkCreateMixin,
+                      CachedListMixin,
+                      ConditionalListMixin,
+                      DeltaSyncMixin,
+                      BatchRetrieveMixin,
+                      FastListMixin,
+                      SparseFieldsMixin,
+                      generics.ListCreateAPIView):
+    """Base class for API list endpoints."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Without an ORDER BY the database may scan any index, keep list order stable.
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        return queryset
+
+
+class CatalogDetailView(SparseFieldsMixin, generics.RetrieveAPIView):
+    """Base class for read-only API detail endpoints."""
+
+
+class GenreList(CatalogListView):
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
 
 
-class GenreDetail(generics.RetrieveUpdateDestroyAPIView):
+class GenreDetail(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAdminUser]
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
 
 
-class LabelList(generics.ListCreateAPIView):
+class LabelList(CatalogListView):
+    queryset = Label.objects.all()
+    serializer_class = LabelSerializer
+
+
+class LabelDetail(CatalogDetailView):
     queryset = Label.objects.all()
     serializer_class = LabelSerializer
 
 
-class MusicianList(generics.ListCreateAPIView):
+class MusicianList(CatalogListView):
     queryset = Musician.objects.all()
     serializer_class = MusicianSerializer
 
 
-class BandList(generics.ListCreateAPIView):
+class BandList(CatalogListView):
+    queryset = Band.objects.all()
+    serializer_class = BandSerializer
+    filterset = {
+        'country_of_origin': ('country_of_origin', EXACT),
+        'status': ('status', EXACT),
+        'genre': ('genre', EXACT),
+        'formed_in': ('formed_in', RANGE),
+        'current_label': ('current_label', EXACT),
+    }
+
+
+class BandDetail(CatalogDetailView):
     queryset = Band.objects.all()
     serializer_class = BandSerializer
 
 
-class AlbumList(generics.ListCreateAPIView):
+class BandFull(EagerLoadingMixin, generics.RetrieveAPIView):
+    """
+    Band with its genres, current label, lineup and albums in one
+    document, for building a whole band page with a single request.
+    Answers `304 Not Modified` when neither the band nor anything
+    embedded in it has changed.
+    """
+    queryset = Band.objects.all()
+    serializer_class = BandFullSerializer
+
+    def get_signatures(self, pk):
+        return [
+            signature(Band.objects.filter(pk=pk), 'modified', 'current_label__modified'),
+            signature(MusicianBand.objects.filter(band_id=pk), 'modified', 'musician__modified'),
+            signature(Album.objects.filter(band_id=pk), 'modified', 'label__modified'),
+        ]
+
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = validators(
+            self.get_signatures(kwargs['pk']),
+            # Genres have no modification time, renames bump their generation.
+            vary=(request.get_full_path(), request.accepted_media_type, generations([Genre])),
+        )
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+
+class AlbumList(CatalogListView):
+    cursor_ordering = '-added'
+    queryset = Album.objects.all()
+    serializer_class = AlbumSerializer
+    filterset = {
+        'band': ('band', EXACT),
+        'label': ('label', EXACT),
+        'type': ('type', EXACT),
+        # `format` is taken by DRF's renderer override parameter
+        'release_format': ('format', EXACT),
+        'release_date': ('release_date', RANGE),
+    }
+
+
+class AlbumDetail(CatalogDetailView):
     queryset = Album.objects.all()
     serializer_class = AlbumSerializer
 
 
-class ReviewList(generics.ListCreateAPIView):
+class ReviewList(CatalogListView):
+    permission_classes = [permissions.IsAdminUser]
+    cursor_ordering = '-added'
+    queryset = Review.objects.all()
+    serializer_class = ReviewSerializer
+    filterset = {
+        'album': ('album', EXACT),
+        'band': ('band', EXACT),
+        'user': ('user', EXACT),
+        'rating': ('rating', RANGE),
+    }
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+            reviews = serializer.instance if isinstance(serializer.instance, list) else [serializer.instance]
+            update_ratings(added=review_ratings(reviews))
+
+
+class ReviewDetail(CatalogDetailView):
     permission_classes = [permissions.IsAdminUser]
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
 
 
-class MusicianBandList(generics.ListCreateAPIView):
+class MusicianBandList(CatalogListView):
     queryset = MusicianBand.objects.all()
     serializer_class = MusicianBandSerializer
 
 
-class UserList(generics.ListCreateAPIView):
+class UserList(CatalogListView):
     permission_classes = [permissions.IsAdminUser]
     queryset = get_user_model().objects.all().order_by('id')
     serializer_class = UserSerializer
+
+
+class CatalogExport(APIView):
+    """
+    Stream a whole table as newline delimited JSON, one row per line.
+
+    Rows are read as `.values()` dicts through a server-side cursor
+    and written as they arrive, so memory use does not grow with the
+    size of the catalog.
+    """
+    renderer_classes = [NDJSONRenderer]
+    resources = {
+        'genres': Genre,
+        'labels': Label,
+        'musicians': Musician,
+        'bands': Band,
+        'albums': Album,
+        'reviews': Review,
+        'musician-to-band': MusicianBand,
+    }
+    admin_only = {'reviews'}
+
+    def get_permissions(self):
+        if self.kwargs.get('resource') in self.admin_only:
+            return [permissions.IsAdminUser()]
+        return super().get_permissions()
+
+    def get(self, request, resource):
+        model = self.resources.get(resource)
+        if model is None:
+            raise Http404
+        rows = model.objects.order_by('pk').values().iterator(
+            chunk_size=getattr(settings, 'API_EXPORT_CHUNK_SIZE', 2000)
+        )
+        response = StreamingHttpResponse(self.stream(rows), content_type=NDJSONRenderer.media_type)
+        response['Content-Disposition'] = f'attachment; filename="{resource}.ndjson"'
+        return response
+
+    def stream(self, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(NDJSONRenderer.render_line(row))
+            if len(chunk) == 500:
+                yield ''.join(chunk)
+                chunk = []
+        if chunk:
+            yield ''.join(chunk)
+
+
+class DatabasePoolStats(APIView):
+    """
+    Connection pool statistics of the worker process serving the
+    request, by database alias. Empty when pooling is off.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(pool_stats())
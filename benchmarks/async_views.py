@@ -0,0 +1,146 @@
+"""
+Compare API read throughput of the sync views served by the WSGI
+handler, the same views served by the ASGI handler and the native
+async views (API_ASYNC_VIEWS) under concurrent requests.
+
+WSGI requests are driven from a thread pool, ASGI requests from
+asyncio tasks, both in-process, with session cookie authentication.
+
+Usage:
+    python benchmarks/async_views.py [requests] [concurrency]
+"""
+import asyncio
+import os
+import sys
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'all_time_music_project.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.asgi import get_asgi_application  # noqa: E402
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client, RequestFactory  # noqa: E402
+from django.urls import clear_url_caches, include, path  # noqa: E402
+
+from api import async_views, views  # noqa: E402
+from benchmarks.list_serialization import populate  # noqa: E402
+from music_app.models import Album  # noqa: E402
+
+
+def api_urlconf(name, read):
+    module = types.ModuleType(name)
+    module.urlpatterns = [path('api/v1/', include([
+        path('bands/', read.BandList.as_view()),
+        path('albums/', read.AlbumList.as_view()),
+        path('albums/<int:pk>/', read.AlbumDetail.as_view()),
+    ]))]
+    sys.modules[name] = module
+    return name
+
+
+def use_urlconf(name):
+    settings.ROOT_URLCONF = name
+    clear_url_caches()
+
+
+def run_wsgi(paths, cookie, concurrency):
+    handler = get_wsgi_application()
+    factory = RequestFactory()
+
+    def call(url):
+        environ = factory.get(url, HTTP_COOKIE=cookie, HTTP_ACCEPT='application/json').environ
+        statuses = []
+        body = b''.join(handler(environ, lambda status, headers: statuses.append(status)))
+        assert statuses[0].startswith('200'), statuses[0]
+        return body
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(call, paths))
+
+
+def run_asgi(paths, cookie, concurrency):
+    handler = get_asgi_application()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(url):
+        route, _, query = url.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': route, 'raw_path': route.encode(),
+            'query_string': query.encode(), 'root_path': '',
+            'headers': [(b'cookie', cookie.encode()), (b'accept', b'application/json')],
+            'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        }
+        chunks = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                assert message['status'] == 200, message['status']
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        async with semaphore:
+            await handler(scope, receive, send)
+        return b''.join(chunks)
+
+    async def run():
+        return await asyncio.gather(*(call(url) for url in paths))
+
+    return asyncio.run(run())
+
+
+def measure(label, func, paths, *args):
+    start = time.perf_counter()
+    bodies = func(paths, *args)
+    elapsed = time.perf_counter() - start
+    print(f'{label:<18} {elapsed * 1000:8.1f} ms   {len(paths) / elapsed:8.1f} req/s')
+    return bodies
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    settings.API_CACHE_TIMEOUT = 0
+    settings.ALLOWED_HOSTS = ['testserver']
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        populate(2000)
+        client = Client()
+        client.force_login(User.objects.get(username='bench'))
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+        album_ids = list(Album.objects.values_list('id', flat=True)[:100])
+        paths = []
+        for i in range(total):
+            paths.append([
+                f'/api/v1/albums/{album_ids[i % len(album_ids)]}/',
+                '/api/v1/bands/?status=active',
+                '/api/v1/albums/?type=Full-length&release_format=CD&omit=label',
+            ][i % 3])
+
+        sync_urls = api_urlconf('benchmark_sync_urls', views)
+        async_urls = api_urlconf('benchmark_async_urls', async_views)
+        print(f'{total} requests, concurrency {concurrency}')
+        use_urlconf(sync_urls)
+        expected = measure('sync WSGI', run_wsgi, paths, cookie, concurrency)
+        assert measure('sync under ASGI', run_asgi, paths, cookie, concurrency) == expected
+        use_urlconf(async_urls)
+        assert measure('native async', run_asgi, paths, cookie, concurrency) == expected
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
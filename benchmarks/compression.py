@@ -0,0 +1,80 @@
+"""
+Measure CPU time and bytes saved by gzip levels on typical responses:
+API lists, the NDJSON export, the alphabetical band list page and a
+small detail response.
+
+Usage:
+    python benchmarks/compression.py [rows]
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'all_time_music_project.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from all_time_music_project.middleware import compress_bytes, compress_stream  # noqa: E402
+from benchmarks.list_serialization import populate  # noqa: E402
+from music_app.models import Album  # noqa: E402
+
+LEVELS = (1, 6, 9)
+
+
+def fetch(client, path):
+    response = client.get(path)
+    assert response.status_code == 200, (path, response.status_code)
+    if response.streaming:
+        return [bytes(chunk) for chunk in response.streaming_content], True
+    return response.content, False
+
+
+def measure(label, body, streamed, repeat=5):
+    size = sum(map(len, body)) if streamed else len(body)
+    results = []
+    for level in LEVELS:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if streamed:
+                compressed = b''.join(compress_stream(body, level))
+            else:
+                compressed = compress_bytes(body, level)
+            best = min(best, time.perf_counter() - start)
+        results.append(f'L{level} {len(compressed) / size:6.1%} {best * 1000:7.2f} ms')
+    print(f'{label:<28} {size / 1024:9.1f} KiB   ' + '   '.join(results))
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    settings.ALLOWED_HOSTS = ['testserver']
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        populate(rows)
+        client = Client()
+        client.force_login(User.objects.get(username='bench'))
+        album = Album.objects.first()
+        print(f'{rows} albums, {rows // 10} bands; compressed size and CPU time per gzip level')
+        for label, path in (
+            ('album detail (API)', f'/api/v1/albums/{album.id}/'),
+            ('album page of 100 (API)', '/api/v1/albums/?page_size=100'),
+            ('album list (API)', '/api/v1/albums/'),
+            ('band list (API)', '/api/v1/bands/'),
+            ('album export (NDJSON)', '/api/v1/export/albums.ndjson'),
+            ('bands alphabetical (HTML)', '/bands/alphabetical/'),
+        ):
+            measure(label, *fetch(client, path))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare request throughput with a new database connection per request
+(the default, CONN_MAX_AGE = 0) and with pooled connections
+(DATABASE_POOL_SIZE), under concurrent requests.
+
+Each mode runs in its own process, as the database engine is chosen
+when the settings load. Requests are served in-process by the test
+client from a thread pool, closing connections after each request
+like the WSGI and ASGI handlers do. SQLite test databases are created as files
+so that connecting costs what it costs in production; the numbers are
+most telling against the PostgreSQL database of local_settings.py.
+
+Usage:
+    python benchmarks/connection_pool.py [requests] [concurrency] [pool size]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'all_time_music_project.settings')
+
+PATHS = ('/bands/genres/', '/labels/', '/bands/alphabetical/')
+
+
+def run(requests, concurrency):
+    django.setup()
+
+    from django.conf import settings
+    from django.db import close_old_connections, connection, connections
+    from django.test import Client
+
+    from all_time_music_project.db.pool import pool_stats
+    from benchmarks.list_serialization import populate
+
+    settings.ALLOWED_HOSTS = ['testserver']
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        populate(1000)
+        connections.close_all()
+
+        def get(i):
+            response = Client().get(PATHS[i % len(PATHS)])
+            assert response.status_code == 200, response.status_code
+            # the test client skips this end of request cleanup of the handlers
+            close_old_connections()
+
+        with ThreadPoolExecutor(concurrency) as executor:
+            list(executor.map(get, range(concurrency)))
+            start = time.perf_counter()
+            list(executor.map(get, range(requests)))
+            elapsed = time.perf_counter() - start
+        print(f'{connection.settings_dict["ENGINE"]:<40} {requests / elapsed:8.0f} requests/s')
+        for alias, stats in pool_stats().items():
+            print(f'  pool {alias}: ' + ', '.join(f'{key} {value}' for key, value in stats.items()))
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def main():
+    requests = sys.argv[1] if len(sys.argv) > 1 else '2000'
+    concurrency = sys.argv[2] if len(sys.argv) > 2 else '8'
+    pool_size = sys.argv[3] if len(sys.argv) > 3 else concurrency
+    print(f'{requests} requests, {concurrency} concurrent')
+    for pooled in ('', pool_size):
+        env = {**os.environ, 'DATABASE_POOL_SIZE': pooled}
+        subprocess.run([sys.executable, __file__, '--run', requests, concurrency], env=env, check=True)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        run(int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        main()
@@ -0,0 +1,94 @@
+"""
+Compare rendering API list responses through the model serializers
+with the `.values()` fast path used by the list views.
+
+Usage:
+    python benchmarks/list_serialization.py [rows]
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'all_time_music_project.settings')
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from api.fastpath import fast_list_plan  # noqa: E402
+from api.serializers import AlbumSerializer, BandSerializer  # noqa: E402
+from music_app.models import Album, Band, Genre, Label  # noqa: E402
+
+
+def populate(rows):
+    user = User.objects.create_user(username='bench', password='bench')
+    label = Label.objects.create(name='Bench Records', address='-', country='Poland', status=1,
+                                 styles='metal', founding_year=1990, added_by=user)
+    genres = Genre.objects.bulk_create([Genre(name=f'genre {i}') for i in range(10)])
+    bands = Band.objects.bulk_create([
+        Band(name=f'Band {i}', country_of_origin='Poland', location='Gdańsk', status=i % 6 + 1,
+             formed_in=1980 + i % 40, lyrical_themes='war', current_label=label,
+             bio='x' * 500, added_by=user)
+        for i in range(rows // 10)
+    ])
+    albums = Album.objects.bulk_create([
+        Album(title=f'Album {i}', band=bands[i % len(bands)], type=i % 11 + 1,
+              release_date='1990-01-01', catalog_id=f'CAT-{i}', label=label,
+              format=i % 7 + 1, added_by=user)
+        for i in range(rows)
+    ])
+    Band.genre.through.objects.bulk_create([
+        Band.genre.through(band_id=band.pk, genre_id=genres[i % 10].pk) for i, band in enumerate(bands)
+    ])
+    Album.genre.through.objects.bulk_create([
+        Album.genre.through(album_id=album.pk, genre_id=genres[(i + j) % 10].pk)
+        for i, album in enumerate(albums) for j in range(2)
+    ])
+
+
+def measure(func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def compare(serializer_class, queryset):
+    renderer = JSONRenderer()
+
+    def serializer():
+        instances = serializer_class.setup_eager_loading(queryset.all())
+        return renderer.render(serializer_class(instances, many=True).data)
+
+    def fast_path():
+        plan = fast_list_plan(serializer_class)
+        return renderer.render(plan.render(plan.values(queryset.all())))
+
+    slow_time, slow_body = measure(serializer)
+    fast_time, fast_body = measure(fast_path)
+    assert slow_body == fast_body, 'fast path output differs from the serializer'
+    print(f'{serializer_class.__name__:<18} serializer {slow_time * 1000:8.1f} ms'
+          f'   fast path {fast_time * 1000:8.1f} ms   speedup {slow_time / fast_time:4.1f}x')
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        populate(rows)
+        print(f'{rows} albums, {rows // 10} bands')
+        compare(AlbumSerializer, Album.objects.all())
+        compare(BandSerializer, Band.objects.all())
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
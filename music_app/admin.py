@@ -1,3 +1,17 @@
 from django.contrib import admin
 
-# Register your models here.
+from music_app.models import DeletionJob
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'status', 'step', 'progress', 'requested_by', 'added', 'modified')
+    list_filter = ('status', 'model')
+    readonly_fields = [field.name for field in DeletionJob._meta.fields]
+
+    @admin.display(description='progress')
+    def progress(self, job):
+        return f'{job.deleted} of {job.total} rows ({min(job.deleted / max(job.total, 1), 1):.0%})'
+
+    def has_add_permission(self, request):
+        return False
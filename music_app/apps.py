@@ -1,6 +1,55 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, pre_delete
+
+
+def create_search_index(using, **kwargs):
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and 'music_app_band' in connection.introspection.table_names():
+        from music_app.search import ensure_sqlite_index
+        ensure_sqlite_index(connection)
+
+
+def connect_counters():
+    """
+    Keep counters up to date on deletes, including cascades, and on
+    many-to-many changes. Other writes update them where they happen,
+    see `update_counters`.
+    """
+    from music_app import counters
+
+    for source in {counter.source for counter in counters.COUNTERS}:
+        if source._meta.auto_created:
+            m2m_changed.connect(
+                counters.count_changed_relations, sender=source, dispatch_uid=f'counters-m2m-{source._meta.label}'
+            )
+        else:
+            post_delete.connect(
+                counters.count_deleted_row, sender=source, dispatch_uid=f'counters-delete-{source._meta.label}'
+            )
+    for model in set().union(*map(counters.relation_owners, counters.COUNTERS)):
+        pre_delete.connect(
+            counters.count_deleted_relations, sender=model, dispatch_uid=f'counters-m2m-delete-{model._meta.label}'
+        )
+
+
+def connect_ratings():
+    """
+    Take deleted reviews out of rating aggregates, including cascades.
+    Created and updated reviews are applied where they are saved, see
+    `update_ratings`.
+    """
+    from music_app import ratings
+    from music_app.models import Review
+
+    post_delete.connect(ratings.rate_deleted_review, sender=Review, dispatch_uid='ratings-delete-review')
 
 
 class MusicAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'music_app'
+
+    def ready(self):
+        post_migrate.connect(create_search_index, sender=self)
+        connect_counters()
+        connect_ratings()
@@ -0,0 +1,63 @@
+from calendar import timegm
+from functools import wraps
+from hashlib import md5
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def signature(queryset, *modified_fields):
+    """
+    Return number of rows and the latest modification time of
+    a queryset, computed with a single aggregate query.
+    """
+    modified_fields = modified_fields or ('modified',)
+    aggregates = queryset.order_by().aggregate(
+        count=Count('pk'),
+        **{f'modified_{i}': Max(field) for i, field in enumerate(modified_fields)}
+    )
+    count = aggregates.pop('count')
+    return count, max((value for value in aggregates.values() if value), default=None)
+
+
+def validators(signatures, vary=()):
+    """
+    Build (ETag, Last-Modified timestamp) from queryset signatures.
+    Everything else the response depends on goes to `vary`.
+    """
+    last_modified = max((modified for _, modified in signatures if modified), default=None)
+    if last_modified is not None:
+        last_modified = timegm(last_modified.utctimetuple())
+    digest = md5(repr((signatures, tuple(vary))).encode()).hexdigest()
+    return quote_etag(digest), last_modified
+
+
+def set_validators(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        if last_modified is not None:
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+    return response
+
+
+def conditional_get(signatures_func):
+    """
+    Decorator for `get` method of class based views. Answers
+    `304 Not Modified` without rendering the page when the validators
+    derived from `signatures_func(request, *args, **kwargs)` match.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            user_id = request.user.id if request.user.is_authenticated else None
+            etag, last_modified = validators(
+                signatures_func(request, *args, **kwargs),
+                vary=(request.get_full_path(), user_id),
+            )
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = method(view, request, *args, **kwargs)
+            return set_validators(response, etag, last_modified)
+        return wrapper
+    return decorator
@@ -0,0 +1,157 @@
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.dispatch import Signal
+from django.utils import timezone
+
+from all_time_music_project.routers import use_primary
+from music_app.deletion import defer_update
+from music_app.models import Album, Band, Genre, Label, Musician, MusicianBand
+
+# Sent with the model as sender after counters of its rows were updated
+# in bulk, without post_save signals.
+counters_changed = Signal()
+
+CountedRelation = namedtuple('CountedRelation', 'model field source key distinct')
+
+COUNTERS = (
+    CountedRelation(Band, 'album_count', Album, 'band_id', None),
+    CountedRelation(Label, 'band_count', Band, 'current_label_id', None),
+    CountedRelation(Genre, 'band_count', Band.genre.through, 'genre_id', None),
+    CountedRelation(Genre, 'album_count', Album.genre.through, 'genre_id', None),
+    # a musician can be in the same band more than once, in different roles or years
+    CountedRelation(Musician, 'band_count', MusicianBand, 'musician_id', 'band_id'),
+)
+
+
+def counters_of(source):
+    return [counter for counter in COUNTERS if counter.source is source]
+
+
+def counted_state(instance):
+    """
+    Counted keys of an instance, to be passed to `update_counters` as
+    removed once the instance has been changed.
+    """
+    return {counter.key: getattr(instance, counter.key) for counter in counters_of(type(instance))}
+
+
+def count_of(counter):
+    return Count(counter.distinct, distinct=True) if counter.distinct else Count('pk')
+
+
+def update_counters(source, added=(), removed=()):
+    """
+    Apply added and removed `source` rows to the counters over them.
+    Rows are model instances or dicts of counted keys. Rows with the
+    same change are updated with one UPDATE and counters never drop
+    below zero. Counters of distinct values are recounted instead.
+    """
+    for counter in counters_of(source):
+        deltas = defaultdict(int)
+        for rows, delta in ((added, 1), (removed, -1)):
+            for row in rows:
+                pk = row.get(counter.key) if isinstance(row, dict) else getattr(row, counter.key)
+                if pk is not None:
+                    deltas[pk] += delta
+
+        if counter.distinct:
+            changes = {None: sorted(deltas)} if deltas else {}
+        else:
+            changes = defaultdict(list)
+            for pk, delta in sorted(deltas.items()):
+                if delta:
+                    changes[delta].append(pk)
+        if not changes:
+            continue
+
+        now = timezone.now()
+        with transaction.atomic(savepoint=False):
+            for delta, pks in sorted(changes.items(), key=lambda item: item[0] or 0):
+                if delta is None:
+                    counted = source._base_manager.filter(**{counter.key: OuterRef('pk')}).order_by()
+                    value = Coalesce(Subquery(
+                        counted.values(counter.key).annotate(count=count_of(counter)).values('count')
+                    ), 0)
+                else:
+                    value = Greatest(F(counter.field) + delta, Value(0))
+                counter.model._base_manager.filter(pk__in=pks).update(**{counter.field: value, 'modified': now})
+        counters_changed.send(sender=counter.model)
+
+
+def rebuild_counters(counter, model=None, source=None, batch_size=1000):
+    """
+    Recompute a counter of all rows from scratch with one grouped
+    query. Only rows whose counter changed are written. Historical
+    models can be passed in migrations. Returns the number of rows
+    updated. Reads go to the primary, a lagging replica would persist
+    stale counts.
+    """
+    model = model or counter.model
+    source = source or counter.source
+    now = timezone.now()
+    changed = []
+    with use_primary():
+        counts = dict(source._base_manager.order_by().values_list(counter.key).annotate(count=count_of(counter)))
+        for obj in model._base_manager.only('pk', counter.field).iterator(chunk_size=batch_size):
+            count = counts.get(obj.pk, 0)
+            if getattr(obj, counter.field) != count:
+                setattr(obj, counter.field, count)
+                obj.modified = now
+                changed.append(obj)
+    model._base_manager.bulk_update(changed, (counter.field, 'modified'), batch_size=batch_size)
+    return len(changed)
+
+
+def link_fields(through, model):
+    """The foreign keys of a many-to-many through table to `model` and to the other side."""
+    relations = [field for field in through._meta.concrete_fields if field.is_relation]
+    field = next(field for field in relations if field.related_model is model)
+    other = next(other for other in relations if other is not field)
+    return field, other
+
+
+def relation_owners(counter):
+    """Models other than the counted one whose deletes cascade to rows of a many-to-many counter."""
+    return {
+        field.related_model for field in counter.source._meta.concrete_fields
+        if counter.source._meta.auto_created and field.is_relation and field.related_model is not counter.model
+    }
+
+
+def remove_counted(source, rows):
+    update_counters(source, removed=rows)
+
+
+def count_deleted_row(sender, instance, **kwargs):
+    defer_update(remove_counted, sender, [counted_state(instance)])
+
+
+def count_changed_relations(sender, instance, action, pk_set, **kwargs):
+    """
+    Count rows added to and removed from a many-to-many relation.
+    Removed rows are looked up before they are deleted, as `pk_set` of
+    remove() may include rows which were not linked at all.
+    """
+    field, other = link_fields(sender, type(instance))
+    if action == 'post_add' and pk_set:
+        update_counters(sender, added=[{field.attname: instance.pk, other.attname: pk} for pk in pk_set])
+    elif action in ('pre_remove', 'pre_clear'):
+        rows = sender.objects.filter(**{field.attname: instance.pk})
+        if pk_set is not None:
+            rows = rows.filter(**{f'{other.attname}__in': pk_set})
+        update_counters(sender, removed=rows)
+
+
+def count_deleted_relations(sender, instance, **kwargs):
+    """
+    Count many-to-many rows deleted together with `instance`, deletes
+    of through table rows send no signals.
+    """
+    for counter in COUNTERS:
+        if counter.source._meta.auto_created and sender in relation_owners(counter):
+            field, _ = link_fields(counter.source, sender)
+            rows = counter.source.objects.filter(**{field.attname: instance.pk}).values(counter.key)
+            defer_update(remove_counted, counter.source, list(rows))
@@ -0,0 +1,195 @@
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.utils import timezone
+
+from all_time_music_project.routers import use_primary
+from music_app.models import DeletionJob
+
+logger = logging.getLogger(__name__)
+
+PENDING, RUNNING, DONE, FAILED = 1, 2, 3, 4
+
+# {(apply, sender): rows} deferred by defer_update() in a batch_updates() block
+pending_updates = ContextVar('deletion_pending_updates', default=None)
+
+
+@contextmanager
+def batch_updates():
+    """
+    Defer what delete signal receivers write per deleted row, counters,
+    ratings, tombstones and cache generations, to the end of the block,
+    and write it once for all rows, e.g. one UPDATE per changed counter
+    instead of one per deleted album. Use it inside the transaction of
+    the delete. Nested blocks are part of the outermost one.
+    """
+    if pending_updates.get() is not None:
+        yield
+        return
+    token = pending_updates.set({})
+    try:
+        yield
+        pending = pending_updates.get()
+    finally:
+        pending_updates.reset(token)
+    for (apply, sender), rows in pending.items():
+        apply(sender, rows)
+
+
+def defer_update(apply, sender, rows):
+    """
+    Call `apply(sender, rows)` at the end of the current `batch_updates()`
+    block, together with the rows of other calls with the same `apply`
+    and `sender`, or right away outside of one.
+    """
+    pending = pending_updates.get()
+    if pending is None:
+        apply(sender, rows)
+    else:
+        pending.setdefault((apply, sender), []).extend(rows)
+
+
+def cascade_plan(model, path=''):
+    """
+    Return (model, lookup to the deleted row) of every model a delete of
+    `model` cascades to, dependent rows before the rows they refer to,
+    and `model` itself last. Through tables of many-to-many fields are
+    left to the deletes of their owners, which count them.
+    """
+    plan = []
+    for relation in model._meta.related_objects:
+        if relation.on_delete is not models.CASCADE or relation.related_model._meta.auto_created:
+            continue
+        plan += cascade_plan(relation.related_model, f'{relation.field.name}__{path}' if path else relation.field.name)
+    plan.append((model, path or 'pk'))
+    return plan
+
+
+def cascade_size(obj):
+    """Number of rows a delete of `obj` removes, through table rows aside."""
+    conditions = {}
+    for model, lookup in cascade_plan(type(obj)):
+        conditions[model] = conditions.get(model, models.Q()) | models.Q(**{lookup: obj.pk})
+    return sum(model._base_manager.filter(condition).count() for model, condition in conditions.items())
+
+
+def hide_dependents(obj):
+    """
+    Hide the rows a delete of `obj` cascades to with one UPDATE per
+    relation, so they leave lists and pages together with `obj`.
+    """
+    hidden = set()
+    for model, lookup in cascade_plan(type(obj))[:-1]:
+        if model._base_manager.filter(**{lookup: obj.pk}, hidden=False).update(hidden=True):
+            hidden.add(model)
+    # update() sends no post_save signals, invalidate cached API responses here.
+    if apps.is_installed('api'):
+        from api.cache import bump_generation
+        for model in hidden:
+            bump_generation(model)
+
+
+def delete(obj, user=None):
+    """
+    Delete `obj` right away when the delete cascades to at most
+    DELETE_SYNC_LIMIT rows. Larger deletes hide the row and its
+    dependent rows and leave the cascade to a DeletionJob, which is
+    returned.
+    """
+    total = cascade_size(obj)
+    if total <= getattr(settings, 'DELETE_SYNC_LIMIT', 1000):
+        with transaction.atomic(), batch_updates():
+            obj.delete()
+        return None
+
+    with transaction.atomic():
+        obj.hidden = True
+        obj.save(update_fields=['hidden', 'modified'])
+        hide_dependents(obj)
+        job = DeletionJob.objects.create(
+            model=obj._meta.label_lower, object_id=obj.pk, name=str(obj)[:100], total=total, requested_by=user,
+        )
+        if getattr(settings, 'DELETE_IN_THREAD', True):
+            transaction.on_commit(lambda: threading.Thread(target=run_in_thread, args=(job.pk,), daemon=True).start())
+    return job
+
+
+def claim(job_pk, stale_after=None, retry=False):
+    """
+    Mark a job as running, unless another worker runs it. Jobs which
+    are running but were not updated for `stale_after` are taken over,
+    failed ones with `retry`. Returns whether the job was claimed.
+    """
+    runnable = models.Q(status=PENDING)
+    if stale_after is not None:
+        runnable |= models.Q(status=RUNNING, modified__lt=timezone.now() - stale_after)
+    if retry:
+        runnable |= models.Q(status=FAILED)
+    return bool(DeletionJob.objects.filter(runnable, pk=job_pk).update(status=RUNNING, modified=timezone.now()))
+
+
+def run(job, chunk_size=None):
+    """
+    Delete the rows of a claimed job, `chunk_size` rows per transaction,
+    saving its progress after each chunk. Deletes send their signals,
+    which keep counters, ratings, tombstones and cached API responses in
+    step, batched per chunk.
+    A failure is logged and recorded on the job, which can be retried
+    and continues where it stopped.
+    """
+    chunk_size = chunk_size or getattr(settings, 'DELETE_CHUNK_SIZE', 500)
+    model = apps.get_model(job.model)
+    try:
+        with use_primary():
+            for step, lookup in cascade_plan(model):
+                job.step = step._meta.verbose_name_plural
+                job.save(update_fields=['step', 'modified'])
+                rows = step._base_manager.filter(**{lookup: job.object_id}).order_by('pk')
+                while True:
+                    pks = list(rows.values_list('pk', flat=True)[:chunk_size])
+                    if not pks:
+                        break
+                    with transaction.atomic(), batch_updates():
+                        _, counts = step._base_manager.filter(pk__in=pks).delete()
+                    job.deleted += counts.get(step._meta.label, 0)
+                    job.save(update_fields=['deleted', 'modified'])
+    except Exception as error:
+        logger.exception('Deleting %s failed', job)
+        job.status = FAILED
+        job.error = repr(error)
+        job.save(update_fields=['status', 'error', 'modified'])
+        return
+    job.status = DONE
+    job.step = ''
+    job.error = ''
+    job.save(update_fields=['status', 'step', 'error', 'modified'])
+
+
+def run_in_thread(job_pk):
+    try:
+        with use_primary():
+            if claim(job_pk):
+                run(DeletionJob.objects.get(pk=job_pk))
+    finally:
+        connections.close_all()
+
+
+def run_pending(stale_after=timedelta(minutes=10), retry=False, chunk_size=None):
+    """
+    Run pending jobs, running ones which stopped making progress, and
+    failed ones with `retry`. Returns the jobs run.
+    """
+    jobs = []
+    with use_primary():
+        for job_pk in DeletionJob.objects.exclude(status=DONE).order_by('pk').values_list('pk', flat=True):
+            if claim(job_pk, stale_after, retry):
+                job = DeletionJob.objects.get(pk=job_pk)
+                run(job, chunk_size)
+                jobs.append(job)
+    return jobs
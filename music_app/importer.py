@@ -0,0 +1,333 @@
+import csv
+import json
+from collections import namedtuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from music_app.counters import counted_state, update_counters
+from music_app.models import Album, Band, Genre, Label, Musician, MusicianBand
+
+# Separates the names of many-related rows in a CSV cell, e.g. "rock;heavy metal".
+LIST_SEPARATOR = ';'
+
+# A foreign key written as the natural key of the related row, {input column: related field}.
+Reference = namedtuple('Reference', 'field columns')
+
+# What a file of one kind holds: the model, the fields identifying a row,
+# the plain fields read, the foreign keys and the many-to-many fields
+# written as lists of names. Column names follow the API representation.
+ImportSpec = namedtuple('ImportSpec', 'model key fields references many_to_many')
+
+SPECS = {
+    'genres': ImportSpec(Genre, ('name',), ('name',), (), ()),
+    'labels': ImportSpec(
+        Label, ('name',), ('name', 'address', 'country', 'status', 'styles', 'founding_year'), (), (),
+    ),
+    'musicians': ImportSpec(
+        Musician, ('name', 'full_name'), ('name', 'full_name', 'born', 'died', 'place_of_birth', 'bio'), (), (),
+    ),
+    'bands': ImportSpec(
+        Band,
+        ('name', 'country_of_origin'),
+        ('name', 'country_of_origin', 'location', 'status', 'formed_in', 'ended_in', 'lyrical_themes', 'bio'),
+        (Reference('current_label', {'current_label': 'name'}),),
+        ('genre',),
+    ),
+    'lineups': ImportSpec(
+        MusicianBand,
+        ('musician', 'band', 'role', 'year_from'),
+        ('year_from', 'year_to', 'role'),
+        (
+            Reference('musician', {'nickname': 'name', 'real_name': 'full_name'}),
+            Reference('band', {'band': 'name'}),
+        ),
+        (),
+    ),
+    'albums': ImportSpec(
+        Album,
+        ('band', 'title'),
+        ('title', 'type', 'release_date', 'catalog_id', 'format'),
+        (Reference('band', {'band': 'name'}), Reference('label', {'label': 'name'})),
+        ('genre',),
+    ),
+}
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as file:
+        yield from csv.DictReader(file)
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        yield from json.load(file)
+
+
+def read_ndjson(path):
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+    'ndjson': read_ndjson,
+}
+
+
+def natural_key(kind):
+    """Fields matching rows of `kind` to existing ones, see the IMPORT_NATURAL_KEYS setting."""
+    return tuple(getattr(settings, 'IMPORT_NATURAL_KEYS', {}).get(kind, SPECS[kind].key))
+
+
+def load_keys(model, lookups):
+    """
+    {natural key: pk} of all rows of `model`, read with one query.
+    Keys shared by several rows map to None.
+    """
+    keys = {}
+    rows = model._default_manager.order_by().values_list(*lookups, 'pk')
+    for *key, pk in rows.iterator(chunk_size=10000):
+        key = tuple(key)
+        keys[key] = None if key in keys else pk
+    return keys
+
+
+class CatalogImporter:
+    """
+    Create the rows of one import spec from dicts, `batch_size` rows
+    per transaction with `bulk_create`, through table rows included.
+
+    Related rows are resolved by natural key from indexes loaded once
+    up front. Rows whose `key` already exists are skipped, so an
+    interrupted import can simply be run again, or with `update` are
+    compared with the stored row and only changed fields are written
+    with `bulk_update`. Many-to-many relations are reconciled when the
+    row has their column. Invalid rows are collected in `errors` as
+    (row number, ValidationError) and skipped.
+    """
+    def __init__(self, spec, user=None, batch_size=1000, key=None, update=False):
+        self.spec = spec
+        self.model = spec.model
+        self.user = user
+        self.batch_size = batch_size
+        self.key = tuple(key or spec.key)
+        self.update = update
+        opts = self.model._meta
+
+        self.fields = [opts.get_field(name) for name in spec.fields]
+        self.choices = {
+            field.name: {str(label): value for value, label in field.flatchoices}
+            for field in self.fields if field.choices
+        }
+        self.key_fields = [opts.get_field(name) for name in self.key]
+        self.references = {
+            reference.field: load_keys(opts.get_field(reference.field).related_model, tuple(reference.columns.values()))
+            for reference in spec.references
+        }
+        self.many_to_many = {
+            name: load_keys(opts.get_field(name).related_model, ('name',)) for name in spec.many_to_many
+        }
+        self.existing = load_keys(self.model, self.key)
+        self.compared = [field.attname for field in self.fields] + [
+            opts.get_field(reference.field).attname for reference in spec.references
+        ]
+
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.errors = []
+
+    def key_of(self, instance):
+        return tuple(getattr(instance, field.attname) for field in self.key_fields)
+
+    def clean(self, field, value):
+        if value in (None, '') and field.null:
+            return None
+        if isinstance(value, str) and field.name in self.choices:
+            value = self.choices[field.name].get(value, value)
+        return field.clean(value, None)
+
+    def resolve(self, keys, model, display):
+        pk = keys.get(display)
+        if pk is None:
+            shown = ', '.join(str(part) for part in display)
+            problem = 'is ambiguous' if display in keys else 'does not exist'
+            raise ValidationError(f'{model._meta.verbose_name} "{shown}" {problem}.')
+        return pk
+
+    def build(self, row):
+        """Return an unsaved instance and {many-to-many field: related pks} of a row."""
+        values, related, errors = {}, {}, {}
+        opts = self.model._meta
+
+        for field in self.fields:
+            try:
+                values[field.attname] = self.clean(field, row.get(field.name))
+            except ValidationError as error:
+                errors[field.name] = error.messages
+
+        for reference in self.spec.references:
+            field = opts.get_field(reference.field)
+            key = tuple(row.get(column) for column in reference.columns)
+            try:
+                values[field.attname] = self.resolve(self.references[field.name], field.related_model, key)
+            except ValidationError as error:
+                errors[field.name] = error.messages
+
+        for name in self.spec.many_to_many:
+            if self.update and name not in row:
+                continue
+            names = row.get(name) or []
+            if isinstance(names, str):
+                names = [part.strip() for part in names.split(LIST_SEPARATOR) if part.strip()]
+            related_model = opts.get_field(name).related_model
+            related[name] = []
+            for related_name in names:
+                try:
+                    related[name].append(self.resolve(self.many_to_many[name], related_model, (related_name,)))
+                except ValidationError as error:
+                    errors.setdefault(name, []).extend(error.messages)
+
+        if errors:
+            raise ValidationError(errors)
+        if any(field.name == 'added_by' for field in opts.concrete_fields):
+            values['added_by_id'] = self.user.pk
+        return self.model(**values), related
+
+    def run(self, rows, skip=0, on_batch=None):
+        """
+        Import `rows`, ignoring the first `skip` of them. `on_batch` is
+        called with the number of rows read after every committed batch.
+        """
+        created, changed = {}, {}
+        number = 0
+        for number, row in enumerate(rows, 1):
+            if number <= skip:
+                continue
+            try:
+                instance, related = self.build(row)
+            except ValidationError as error:
+                self.errors.append((number, error))
+                continue
+
+            key = self.key_of(instance)
+            if key in created or key in self.existing and not self.update:
+                self.skipped += 1
+            elif key in self.existing:
+                pk = self.existing[key]
+                if pk is None:
+                    shown = ', '.join(str(part) for part in key)
+                    self.errors.append((number, ValidationError(
+                        {NON_FIELD_ERRORS: [f'"{shown}" matches several existing rows.']}
+                    )))
+                    continue
+                if pk in changed:
+                    self.skipped += 1
+                changed[pk] = instance, related
+            else:
+                created[key] = instance, related
+
+            if len(created) + len(changed) >= self.batch_size:
+                self.save(list(created.values()), changed)
+                created, changed = {}, {}
+                if on_batch:
+                    on_batch(number)
+
+        if created or changed:
+            self.save(list(created.values()), changed)
+        if on_batch and number > skip:
+            on_batch(number)
+
+    def save(self, created, changed):
+        """
+        Write one batch, `created` (instance, related) pairs of new rows
+        and `changed` {pk: (instance, related)} of existing ones.
+        """
+        instances = [instance for instance, _ in created]
+        throughs = []
+        with transaction.atomic():
+            self.model._default_manager.bulk_create(instances)
+            update_counters(self.model, added=instances)
+            updated = self.save_changes(changed)
+            relinked = set()
+            for name in self.spec.many_to_many:
+                relinked |= self.save_links(name, created, changed)
+                throughs.append(self.model._meta.get_field(name).remote_field.through)
+            if relinked - updated:
+                self.model._default_manager.filter(pk__in=relinked - updated).update(modified=timezone.now())
+
+        for instance in instances:
+            self.existing[self.key_of(instance)] = instance.pk
+        self.created += len(instances)
+        self.updated += len(updated | relinked)
+        self.skipped += len(changed) - len(updated | relinked)
+
+        # bulk_create() and bulk_update() send no post_save signals, invalidate cached API responses here.
+        if apps.is_installed('api'):
+            from api.cache import bump_generation
+            for model in (self.model, *throughs):
+                bump_generation(model)
+
+    def save_changes(self, changed):
+        """
+        Copy the fields of `changed` instances which differ onto the
+        stored rows, with one `bulk_update` per set of changed fields.
+        Return the pks of rows which changed.
+        """
+        if not changed:
+            return set()
+
+        now = timezone.now()
+        groups = {}
+        added, removed = [], []
+        for pk, obj in self.model._default_manager.only(*self.compared).in_bulk(changed).items():
+            instance, _ = changed[pk]
+            fields = tuple(name for name in self.compared if getattr(obj, name) != getattr(instance, name))
+            if not fields:
+                continue
+            removed.append(counted_state(obj))
+            for name in fields:
+                setattr(obj, name, getattr(instance, name))
+            obj.modified = now
+            added.append(obj)
+            groups.setdefault(fields, []).append(obj)
+
+        for fields, objs in groups.items():
+            self.model._default_manager.bulk_update(objs, fields + ('modified',))
+        update_counters(self.model, added=added, removed=removed)
+        return {obj.pk for obj in added}
+
+    def save_links(self, name, created, changed):
+        """
+        Link created rows to the rows named in their `name` column and
+        reconcile the links of changed rows whose input has the column.
+        Return the pks of changed rows whose links were added or removed.
+        """
+        field = self.model._meta.get_field(name)
+        through = field.remote_field.through
+        source, target = f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'
+        reconciled = {pk: related[name] for pk, (_, related) in changed.items() if name in related}
+        wanted = {(instance.pk, pk) for instance, related in created for pk in related.get(name, ())}
+        wanted.update((pk, target_pk) for pk, target_pks in reconciled.items() for target_pk in target_pks)
+
+        removed = []
+        for row in through.objects.filter(**{f'{source}__in': list(reconciled)}).values('pk', source, target):
+            link = row[source], row[target]
+            if link in wanted:
+                wanted.remove(link)
+            else:
+                removed.append(row)
+        if removed:
+            through.objects.filter(pk__in=[row['pk'] for row in removed]).delete()
+        added = through.objects.bulk_create([
+            through(**{source: pk, target: target_pk}) for pk, target_pk in sorted(wanted)
+        ])
+        update_counters(through, added=added, removed=removed)
+        return {pk for pk, _ in wanted if pk in reconciled} | {row[source] for row in removed}
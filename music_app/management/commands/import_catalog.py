@@ -0,0 +1,103 @@
+import json
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from all_time_music_project.routers import use_primary
+from music_app.importer import READERS, SPECS, CatalogImporter, natural_key
+
+
+class Command(BaseCommand):
+    help = (
+        'Import genres, labels, musicians, bands, lineups or albums from a CSV, JSON or NDJSON file, '
+        'with columns named as in the API. Related rows are referred to by name and must be imported first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(SPECS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=list(READERS), help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--user', help='Username set as added_by of imported rows, the first superuser by default.')
+        parser.add_argument(
+            '--update', action='store_true',
+            help='Update the changed fields of rows which already exist instead of skipping them.',
+        )
+        parser.add_argument(
+            '--key',
+            help='Comma-separated fields matching rows to existing ones, '
+                 'the IMPORT_NATURAL_KEYS setting or e.g. name,country_of_origin for bands by default.',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Continue after the last batch committed by an interrupted import of the same file.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Unknown format of {path}, use --format.')
+        try:
+            stat = os.stat(path)
+        except OSError as error:
+            raise CommandError(error)
+
+        spec = SPECS[options['kind']]
+        key = tuple(options['key'].split(',')) if options['key'] else natural_key(options['kind'])
+        unknown = set(key) - set(spec.fields) - {reference.field for reference in spec.references}
+        if unknown:
+            raise CommandError(f'Cannot match {options["kind"]} on {", ".join(sorted(unknown))}.')
+
+        state_path = f'{path}.import-state'
+        fingerprint = {'kind': options['kind'], 'size': stat.st_size, 'mtime': stat.st_mtime}
+        skip = 0
+        if options['resume'] and os.path.exists(state_path):
+            with open(state_path) as file:
+                state = json.load(file)
+            if {key: state.get(key) for key in fingerprint} != fingerprint:
+                raise CommandError(f'{path} has changed since the interrupted import, run it without --resume.')
+            skip = state['position']
+
+        users = User.objects.filter(username=options['user']) if options['user'] else User.objects.filter(
+            is_superuser=True
+        ).order_by('pk')
+        user = users.first()
+        if user is None:
+            raise CommandError('No user to add the rows as, create a superuser or pass --user.')
+
+        start = time.monotonic()
+
+        def report(position):
+            with open(state_path, 'w') as file:
+                json.dump({**fingerprint, 'position': position}, file)
+            elapsed = time.monotonic() - start
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f'{position} rows read, {importer.created} created, '
+                    f'{(position - skip) / elapsed:.0f} rows/s'
+                )
+
+        # Natural keys are read from the primary, replicas may lag behind what was just written.
+        with use_primary():
+            importer = CatalogImporter(
+                spec, user=user, batch_size=options['batch_size'], key=key, update=options['update'],
+            )
+            if skip:
+                self.stdout.write(f'Resuming after row {skip}')
+            importer.run(READERS[file_format](path), skip=skip, on_batch=report)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+
+        for number, error in importer.errors:
+            for field, messages in error.message_dict.items():
+                self.stderr.write(f'row {number}: {field}: {" ".join(messages)}')
+
+        elapsed = time.monotonic() - start
+        rows = importer.created + importer.updated + importer.skipped + len(importer.errors)
+        self.stdout.write(
+            f'{options["kind"]}: {importer.created} created, {importer.updated} updated, {importer.skipped} unchanged, '
+            f'{len(importer.errors)} invalid in {elapsed:.1f}s ({rows / max(elapsed, 1e-6):.0f} rows/s)'
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from music_app.counters import COUNTERS, counters_changed, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute album, band and genre counters of all rows from the related tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for counter in COUNTERS:
+            updated = rebuild_counters(counter, batch_size=options['batch_size'])
+            # bulk_update sends no signals.
+            if updated:
+                counters_changed.send(sender=counter.model)
+            self.stdout.write(f'{counter.model._meta.verbose_name_plural} {counter.field}: {updated} updated')
@@ -0,0 +1,21 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from music_app.models import Album, Band, Review
+from music_app.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute rating aggregates of all albums and bands from their reviews.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model, field in ((Album, 'album_id'), (Band, 'band_id')):
+            updated = rebuild_ratings(model, Review, field, batch_size=options['batch_size'])
+            # bulk_update sends no signals, invalidate cached API responses here.
+            if updated and apps.is_installed('api'):
+                from api.cache import bump_generation
+                bump_generation(model)
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {updated} updated')
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from music_app.deletion import DONE, run_pending
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete hidden labels and bands of pending deletion jobs in chunks, '
+        'and take over jobs which stopped making progress.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Rows per transaction, DELETE_CHUNK_SIZE by default.')
+        parser.add_argument(
+            '--stale-after', type=int, default=10,
+            help='Minutes without progress after which a running job is taken over.',
+        )
+        parser.add_argument('--retry', action='store_true', help='Run failed jobs again.')
+
+    def handle(self, *args, **options):
+        jobs = run_pending(
+            stale_after=timedelta(minutes=options['stale_after']),
+            retry=options['retry'],
+            chunk_size=options['chunk_size'],
+        )
+        for job in jobs:
+            if job.status == DONE:
+                self.stdout.write(f'{job}: {job.deleted} rows deleted')
+            else:
+                self.stderr.write(f'{job}: failed after {job.deleted} rows, {job.error}')
@@ -0,0 +1,39 @@
+import sqlite3
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database to the SQLite replicas of DATABASE_REPLICAS, '
+        'standing in for replication in development.'
+    )
+    # the checks import views, which query the replicas that may still be empty
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep copying every INTERVAL seconds, which simulates replication lag.',
+        )
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        replicas = [alias for alias in settings.DATABASE_REPLICAS if connections[alias].vendor == 'sqlite']
+        if primary.vendor != 'sqlite' or not replicas:
+            raise CommandError('Needs a SQLite primary database and at least one SQLite replica.')
+
+        while True:
+            primary.ensure_connection()
+            for alias in replicas:
+                with closing(sqlite3.connect(connections[alias].settings_dict['NAME'])) as target:
+                    primary.connection.backup(target)
+                self.stdout.write(f'{alias}: copied from {DEFAULT_DB_ALIAS}')
+            primary.close()
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
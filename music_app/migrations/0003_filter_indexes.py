@@ -0,0 +1,57 @@
+# Generated by Django 4.1.2 on 2026-10-18 15:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_app', '0002_alter_album_release_date'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['band', 'release_date'], name='album_band_release_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['label', 'release_date'], name='album_label_release_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['type', 'release_date'], name='album_type_release_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['format', 'release_date'], name='album_format_release_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['release_date'], name='album_release_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='band',
+            index=models.Index(fields=['country_of_origin', 'formed_in'], name='band_country_formed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='band',
+            index=models.Index(fields=['status', 'formed_in'], name='band_status_formed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='band',
+            index=models.Index(fields=['current_label', 'formed_in'], name='band_label_formed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['album', 'rating'], name='review_album_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['band', 'rating'], name='review_band_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['user', 'rating'], name='review_user_rating_idx'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.1.2 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+from music_app.ratings import rebuild_ratings
+
+
+def build_ratings(apps, schema_editor):
+    Review = apps.get_model('music_app', 'Review')
+    rebuild_ratings(apps.get_model('music_app', 'Album'), Review, 'album_id')
+    rebuild_ratings(apps.get_model('music_app', 'Band'), Review, 'band_id')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_app', '0003_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='rating_histogram',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='rating_max',
+            field=models.DecimalField(decimal_places=1, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='rating_mean',
+            field=models.DecimalField(decimal_places=2, max_digits=4, null=True),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='rating_min',
+            field=models.DecimalField(decimal_places=1, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='band',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='band',
+            name='rating_histogram',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='band',
+            name='rating_max',
+            field=models.DecimalField(decimal_places=1, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='band',
+            name='rating_mean',
+            field=models.DecimalField(decimal_places=2, max_digits=4, null=True),
+        ),
+        migrations.AddField(
+            model_name='band',
+            name='rating_min',
+            field=models.DecimalField(decimal_places=1, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='band',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=12),
+        ),
+        migrations.RunPython(build_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.1.2 on 2026-10-18 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_app', '0004_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='genre',
+            name='modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='musicianband',
+            name='modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['modified', 'id'], name='album_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='band',
+            index=models.Index(fields=['modified', 'id'], name='band_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genre',
+            index=models.Index(fields=['modified', 'id'], name='genre_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='label',
+            index=models.Index(fields=['modified', 'id'], name='label_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='musician',
+            index=models.Index(fields=['modified', 'id'], name='musician_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='musicianband',
+            index=models.Index(fields=['modified', 'id'], name='musicianband_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['modified', 'id'], name='review_modified_idx'),
+        ),
+    ]
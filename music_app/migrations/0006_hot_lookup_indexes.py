@@ -0,0 +1,45 @@
+# Generated by Django 4.1.2 on 2026-10-18 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_app', '0005_modified_sync_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['title'], name='album_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['added'], name='album_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='band',
+            index=models.Index(fields=['name'], name='band_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genre',
+            index=models.Index(fields=['name'], name='genre_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='label',
+            index=models.Index(fields=['name'], name='label_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='musician',
+            index=models.Index(fields=['name'], name='musician_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='musician',
+            index=models.Index(fields=['full_name'], name='musician_full_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['added'], name='review_added_idx'),
+        ),
+    ]
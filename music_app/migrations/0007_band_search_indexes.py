@@ -0,0 +1,43 @@
+from django.db import migrations
+
+TRIGRAM_INDEX = 'band_name_trgm_idx'
+FULLTEXT_INDEX = 'band_name_fulltext_idx'
+
+
+def search_indexes():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return [
+        GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name=TRIGRAM_INDEX),
+        GinIndex(SearchVector('name', config='simple'), name=FULLTEXT_INDEX),
+    ]
+
+
+def create_indexes(apps, schema_editor):
+    # SQLite gets an FTS5 table after migrate instead, see music_app.search.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    Band = apps.get_model('music_app', 'Band')
+    for index in search_indexes():
+        schema_editor.add_index(Band, index)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Band = apps.get_model('music_app', 'Band')
+    for index in search_indexes():
+        schema_editor.remove_index(Band, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_app', '0006_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.1.2 on 2026-10-18 15:36
+
+from django.db import migrations, models
+
+from music_app.counters import COUNTERS, rebuild_counters
+
+
+def build_counters(apps, schema_editor):
+    for counter in COUNTERS:
+        rebuild_counters(
+            counter,
+            apps.get_model('music_app', counter.model._meta.object_name),
+            apps.get_model('music_app', counter.source._meta.object_name),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_app', '0007_band_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='band',
+            name='album_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='album_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='band_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='label',
+            name='band_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='musician',
+            name='band_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(build_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('music_app', '0008_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='band',
+            name='hidden',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='label',
+            name='hidden',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.BigIntegerField()),
+                ('name', models.CharField(max_length=100)),
+                ('status', models.IntegerField(choices=[(1, 'pending'), (2, 'running'), (3, 'done'), (4, 'failed')], default=1)),
+                ('step', models.CharField(blank=True, max_length=100)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('deleted', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('added', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('requested_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='deletionjob',
+            index=models.Index(fields=['status', 'modified'], name='deletionjob_status_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_app', '0009_background_deletes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='hidden',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='musicianband',
+            name='hidden',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='hidden',
+            field=models.BooleanField(default=False),
+        ),
+    ]
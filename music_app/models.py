@@ -30,6 +30,13 @@ ALBUM_TYPES = [
     (11, 'Promo'),
 ]
 
+DELETION_STATUS = [
+    (1, 'pending'),
+    (2, 'running'),
+    (3, 'done'),
+    (4, 'failed'),
+]
+
 FORMAT_TYPES = [
     (1, 'CD'),
     (2, 'vinyl'),
@@ -41,9 +48,26 @@ FORMAT_TYPES = [
 ]
 
 
+class VisibleManager(models.Manager):
+    """Rows which are not hidden while a background delete removes them, see music_app.deletion."""
+    def get_queryset(self):
+        return super().get_queryset().filter(hidden=False)
+
+
 class Genre(models.Model):
     name = models.CharField(max_length=30)
 
+    band_count = models.PositiveIntegerField(default=0)
+    album_count = models.PositiveIntegerField(default=0)
+
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['modified', 'id'], name='genre_modified_idx'),
+            models.Index(fields=['name'], name='genre_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -56,10 +80,23 @@ class Label(models.Model):
     styles = models.CharField(max_length=128)
     founding_year = models.IntegerField()
 
+    band_count = models.PositiveIntegerField(default=0)
+
+    hidden = models.BooleanField(default=False)
+
     added = models.DateTimeField(auto_now_add=True)
     added_by = models.ForeignKey(User, on_delete=models.CASCADE)
     modified = models.DateTimeField(auto_now=True)
 
+    objects = VisibleManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['modified', 'id'], name='label_modified_idx'),
+            models.Index(fields=['name'], name='label_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -72,10 +109,19 @@ class Musician(models.Model):
     place_of_birth = models.CharField(max_length=50)
     bio = models.TextField(null=True)
 
+    band_count = models.PositiveIntegerField(default=0)
+
     added = models.DateTimeField(auto_now_add=True)
     added_by = models.ForeignKey(User, on_delete=models.CASCADE)
     modified = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['modified', 'id'], name='musician_modified_idx'),
+            models.Index(fields=['name'], name='musician_name_idx'),
+            models.Index(fields=['full_name'], name='musician_full_name_idx'),
+        ]
+
     def __str__(self):
         return f'{self.name}, {self.full_name}'
 
@@ -93,10 +139,33 @@ class Band(models.Model):
     bio = models.TextField(null=True)
     members = models.ManyToManyField(Musician, through='MusicianBand')
 
+    album_count = models.PositiveIntegerField(default=0)
+
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=1, default=0)
+    rating_mean = models.DecimalField(max_digits=4, decimal_places=2, null=True)
+    rating_min = models.DecimalField(max_digits=3, decimal_places=1, null=True)
+    rating_max = models.DecimalField(max_digits=3, decimal_places=1, null=True)
+    rating_histogram = models.JSONField(default=dict)
+
+    hidden = models.BooleanField(default=False)
+
     added = models.DateTimeField(auto_now_add=True)
     added_by = models.ForeignKey(User, on_delete=models.CASCADE)
     modified = models.DateTimeField(auto_now=True)
 
+    objects = VisibleManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['country_of_origin', 'formed_in'], name='band_country_formed_idx'),
+            models.Index(fields=['status', 'formed_in'], name='band_status_formed_idx'),
+            models.Index(fields=['current_label', 'formed_in'], name='band_label_formed_idx'),
+            models.Index(fields=['modified', 'id'], name='band_modified_idx'),
+            models.Index(fields=['name'], name='band_name_idx'),
+        ]
+
     def __str__(self):
         return f'{self.name}, {self.country_of_origin}'
 
@@ -111,10 +180,34 @@ class Album(models.Model):
     label = models.ForeignKey(Label, on_delete=models.CASCADE)
     format = models.IntegerField(choices=FORMAT_TYPES)
 
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=1, default=0)
+    rating_mean = models.DecimalField(max_digits=4, decimal_places=2, null=True)
+    rating_min = models.DecimalField(max_digits=3, decimal_places=1, null=True)
+    rating_max = models.DecimalField(max_digits=3, decimal_places=1, null=True)
+    rating_histogram = models.JSONField(default=dict)
+
+    hidden = models.BooleanField(default=False)
+
     added = models.DateTimeField(auto_now_add=True)
     added_by = models.ForeignKey(User, on_delete=models.CASCADE)
     modified = models.DateTimeField(auto_now=True)
 
+    objects = VisibleManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['band', 'release_date'], name='album_band_release_idx'),
+            models.Index(fields=['label', 'release_date'], name='album_label_release_idx'),
+            models.Index(fields=['type', 'release_date'], name='album_type_release_idx'),
+            models.Index(fields=['format', 'release_date'], name='album_format_release_idx'),
+            models.Index(fields=['release_date'], name='album_release_idx'),
+            models.Index(fields=['modified', 'id'], name='album_modified_idx'),
+            models.Index(fields=['title'], name='album_title_idx'),
+            models.Index(fields=['added'], name='album_added_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -127,7 +220,22 @@ class Review(models.Model):
     description = models.TextField(null=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    hidden = models.BooleanField(default=False)
+
     added = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    objects = VisibleManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['modified', 'id'], name='review_modified_idx'),
+            models.Index(fields=['added'], name='review_added_idx'),
+            models.Index(fields=['album', 'rating'], name='review_album_rating_idx'),
+            models.Index(fields=['band', 'rating'], name='review_band_rating_idx'),
+            models.Index(fields=['user', 'rating'], name='review_user_rating_idx'),
+        ]
 
 
 class MusicianBand(models.Model):
@@ -137,8 +245,44 @@ class MusicianBand(models.Model):
     year_to = models.IntegerField(null=True)
     role = models.CharField(max_length=50)
 
+    hidden = models.BooleanField(default=False)
+
+    modified = models.DateTimeField(auto_now=True)
+
+    objects = VisibleManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['modified', 'id'], name='musicianband_modified_idx'),
+        ]
+
     def __str__(self):
         return f'{self.musician.name} - {self.musician.full_name}'
 
 
+class DeletionJob(models.Model):
+    """
+    Delete of a label or band with many dependent rows, carried out in
+    bounded chunks in the background while the row is hidden.
+    """
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    name = models.CharField(max_length=100)
+    status = models.IntegerField(choices=DELETION_STATUS, default=1)
+    step = models.CharField(max_length=100, blank=True)
+    total = models.PositiveIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    added = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'modified'], name='deletionjob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id} ({self.name})'
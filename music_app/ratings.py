@@ -0,0 +1,109 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from all_time_music_project.routers import use_primary
+from music_app.deletion import defer_update
+from music_app.models import Album, Band
+
+RATING_FIELDS = (
+    'rating_count',
+    'rating_sum',
+    'rating_mean',
+    'rating_min',
+    'rating_max',
+    'rating_histogram',
+)
+
+
+def rating_key(rating):
+    """Histogram key of a rating, e.g. '7.5'."""
+    return str(Decimal(str(rating)).quantize(Decimal('0.1')))
+
+
+def set_aggregates(obj, histogram):
+    """
+    Set rating aggregates of an album or band from a histogram of
+    {rating key: number of reviews}.
+    """
+    # stale aggregates (reviews written bypassing update_ratings) never go negative
+    histogram = {key: count for key, count in histogram.items() if count > 0}
+    ratings = sorted(Decimal(key) for key in histogram)
+    obj.rating_histogram = {str(rating): histogram[str(rating)] for rating in ratings}
+    obj.rating_count = sum(histogram.values())
+    obj.rating_sum = sum((Decimal(key) * count for key, count in histogram.items()), Decimal('0.0'))
+    obj.rating_min = ratings[0] if ratings else None
+    obj.rating_max = ratings[-1] if ratings else None
+    obj.rating_mean = None
+    if obj.rating_count:
+        obj.rating_mean = (obj.rating_sum / obj.rating_count).quantize(Decimal('0.01'))
+
+
+def update_ratings(added=(), removed=()):
+    """
+    Apply added and removed reviews to the rating aggregates of their
+    albums and bands. Reviews are given as (album id, band id, rating)
+    tuples. Each album and band row is locked and saved once, rows
+    which no longer exist are skipped.
+    """
+    changes = defaultdict(lambda: defaultdict(int))
+    for reviews, delta in ((added, 1), (removed, -1)):
+        for album_id, band_id, rating in reviews:
+            changes[Album, album_id][rating_key(rating)] += delta
+            changes[Band, band_id][rating_key(rating)] += delta
+
+    with transaction.atomic():
+        for (model, pk), delta in sorted(changes.items(), key=lambda item: (item[0][0].__name__, item[0][1])):
+            obj = model._base_manager.select_for_update().only(*RATING_FIELDS).filter(pk=pk).first()
+            if obj is None:
+                # deleted together with its reviews
+                continue
+            histogram = dict(obj.rating_histogram)
+            for key, count in delta.items():
+                histogram[key] = histogram.get(key, 0) + count
+            set_aggregates(obj, histogram)
+            obj.save(update_fields=RATING_FIELDS + ('modified',))
+
+
+def review_ratings(reviews):
+    return [(review.album_id, review.band_id, review.rating) for review in reviews]
+
+
+def remove_ratings(sender, reviews):
+    update_ratings(removed=reviews)
+
+
+def rate_deleted_review(sender, instance, **kwargs):
+    """
+    post_delete receiver taking a deleted review out of the aggregates,
+    whichever delete removed it, cascades included.
+    """
+    defer_update(remove_ratings, sender, review_ratings([instance]))
+
+
+def rebuild_ratings(model, review_model, related_field, batch_size=1000):
+    """
+    Recompute rating aggregates of all `model` rows from scratch with
+    one grouped query over `review_model`. Only rows whose aggregates
+    changed are written. Returns the number of rows updated. Reads go
+    to the primary, a lagging replica would persist stale aggregates.
+    """
+    histograms = defaultdict(dict)
+    now = timezone.now()
+    changed = []
+    with use_primary():
+        rows = review_model._base_manager.order_by().values_list(related_field, 'rating').annotate(count=Count('pk'))
+        for pk, rating, count in rows:
+            histograms[pk][rating_key(rating)] = histograms[pk].get(rating_key(rating), 0) + count
+
+        for obj in model._base_manager.only('pk', *RATING_FIELDS).iterator(chunk_size=batch_size):
+            current = tuple(getattr(obj, field) for field in RATING_FIELDS)
+            set_aggregates(obj, histograms.get(obj.pk, {}))
+            if tuple(getattr(obj, field) for field in RATING_FIELDS) != current:
+                obj.modified = now
+                changed.append(obj)
+    model._base_manager.bulk_update(changed, RATING_FIELDS + ('modified',), batch_size=batch_size)
+    return len(changed)
@@ -0,0 +1,128 @@
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from music_app.models import Band
+
+SQLITE_FTS_TABLE = 'music_app_band_fts'
+
+
+class SearchBackend:
+    """Find bands by name. `search()` returns a queryset, best matches first."""
+    def search(self, query):
+        raise NotImplementedError('.search() must be overridden')
+
+
+class SubstringSearchBackend(SearchBackend):
+    """
+    Case-insensitive substring match without ranking or index support,
+    for databases with no better option.
+    """
+    def search(self, query):
+        return Band.objects.filter(name__icontains=query).order_by('name', 'id')
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Full-text match of whole words plus trigram similarity, which also
+    catches partial words and typos. Both use GIN indexes created by the
+    band_search_indexes migration. Results are ranked by the sum of the
+    full-text rank and the similarity.
+    """
+    def search(self, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+
+        document = SearchVector('name', config='simple')
+        text_query = SearchQuery(query, config='simple')
+        return Band.objects.annotate(
+            document=document,
+            similarity=TrigramSimilarity('name', query),
+        ).filter(
+            Q(document=text_query) | Q(name__trigram_similar=query)
+        ).annotate(
+            rank=SearchRank(document, text_query) + F('similarity'),
+        ).order_by('-rank', 'name', 'id')
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    Substring match on an FTS5 trigram index, ranked with bm25. The
+    index is kept up to date by triggers, see `ensure_sqlite_index`.
+    Terms shorter than three characters cannot use trigrams and fall
+    back to a substring scan.
+    """
+    def search(self, query):
+        terms = query.split()
+        if not terms or min(len(term) for term in terms) < 3:
+            return SubstringSearchBackend().search(query)
+
+        match = ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        matches = RawSQL(f'SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s', [match])
+        # bm25() needs the MATCH, the rowid lookup keeps it to the band at hand
+        rank = RawSQL(
+            f'SELECT bm25({SQLITE_FTS_TABLE}) FROM {SQLITE_FTS_TABLE} '
+            f'WHERE {SQLITE_FTS_TABLE} MATCH %s AND rowid = {Band._meta.db_table}.id',
+            [match],
+        )
+        return Band.objects.filter(id__in=matches).annotate(rank=rank).order_by('rank', 'name', 'id')
+
+
+def ensure_sqlite_index(connection):
+    """
+    Create the FTS5 index of band names and its triggers when missing.
+    Table rebuilds by SQLite migrations drop the triggers, so this runs
+    after every migrate. Returns False when FTS5 is not available.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+            [f'{SQLITE_FTS_TABLE}_%'],
+        )
+        triggers = {row[0] for row in cursor.fetchall()}
+        if len(triggers) == 3:
+            return True
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5("
+                f"name, content='music_app_band', content_rowid='id', tokenize='trigram')"
+            )
+        except OperationalError:
+            return False
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_insert AFTER INSERT ON music_app_band BEGIN "
+            f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_delete AFTER DELETE ON music_app_band BEGIN "
+            f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_update AFTER UPDATE OF name ON music_app_band BEGIN "
+            f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); "
+            f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END"
+        )
+        cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def sqlite_index_ready(connection):
+    return SQLITE_FTS_TABLE in connection.introspection.table_names()
+
+
+def get_search_backend(using='default'):
+    """
+    Return the backend named by the SEARCH_BACKEND setting, or the best
+    one for the database: PostgreSQL, SQLite with FTS5, or substring.
+    """
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if connection.vendor == 'sqlite' and sqlite_index_ready(connection):
+        return SQLiteSearchBackend()
+    return SubstringSearchBackend()
@@ -1,7 +1,17 @@
+import json
+from decimal import Decimal
+from io import StringIO
+
 import pytest
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client
-from music_app.models import Genre, Band, Label, Album, Musician, MusicianBand, Review
+from django.test.utils import CaptureQueriesContext
+from music_app import deletion
+from music_app.counters import counted_state, update_counters
+from music_app.models import Genre, Band, Label, Album, Musician, MusicianBand, Review, DeletionJob
+from music_app.search import SQLiteSearchBackend, get_search_backend
 
 
 @pytest.fixture
@@ -667,3 +677,399 @@ def test_search_band_view(client):
         follow=True)
     assert response.status_code == 200
 
+
+@pytest.mark.django_db
+def test_band_details_conditional_get(client, band, album, genre):
+    response = client.get(f'/band/details/{band.id}/')
+    etag = response['ETag']
+    not_modified = client.get(f'/band/details/{band.id}/', HTTP_IF_NONE_MATCH=etag)
+    assert not_modified.status_code == 304
+    assert not_modified.content == b''
+
+    album.delete()
+    response = client.get(f'/band/details/{band.id}/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+
+    etag = response['ETag']
+    band.genre.add(genre)
+    response = client.get(f'/band/details/{band.id}/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_album_details_conditional_get_varies_by_user(client, album, user):
+    response = client.get(f'/album/details/{album.id}/')
+    etag = response['ETag']
+    client.force_login(user)
+    response = client.get(f'/album/details/{album.id}/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+
+
+def post_review(client, album, band, rating):
+    return client.post(f'/review/create/{album.id}/{band.id}/', {
+        'subject': 'review',
+        'rating': rating,
+        'description': 'review',
+    })
+
+
+@pytest.mark.django_db
+def test_review_views_update_rating_aggregates(client, album, band, user):
+    client.force_login(user)
+    post_review(client, album, band, 8.5)
+    post_review(client, album, band, 6)
+    post_review(client, album, band, 8.5)
+    album.refresh_from_db()
+    assert album.rating_count == 3
+    assert album.rating_sum == Decimal('23.0')
+    assert album.rating_mean == Decimal('7.67')
+    assert (album.rating_min, album.rating_max) == (Decimal('6.0'), Decimal('8.5'))
+    assert album.rating_histogram == {'6.0': 1, '8.5': 2}
+
+    low = Review.objects.get(rating=6)
+    client.post(f'/review/update/{low.id}/', {'subject': 'x', 'rating': 9, 'description': 'x'})
+    client.get(f'/review/delete/{Review.objects.filter(rating=8.5).first().id}/')
+    band.refresh_from_db()
+    assert band.rating_histogram == {'8.5': 1, '9.0': 1}
+    assert (band.rating_count, band.rating_mean, band.rating_min) == (2, Decimal('8.75'), Decimal('8.5'))
+
+    response = client.get(f'/album/details/{album.id}/')
+    assert 'Rating: 8.75 (2 reviews' in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_rebuild_ratings_command(album, band, review):
+    call_command('rebuild_ratings', stdout=StringIO())
+    album.refresh_from_db()
+    band.refresh_from_db()
+    assert album.rating_histogram == band.rating_histogram == {'8.5': 1}
+    assert album.rating_mean == band.rating_mean == Decimal('8.50')
+
+    # update() leaves the aggregates stale
+    Review.objects.filter(pk=review.pk).update(rating=6)
+    output = StringIO()
+    call_command('rebuild_ratings', stdout=output)
+    album.refresh_from_db()
+    assert (album.rating_count, album.rating_mean, album.rating_histogram) == (1, Decimal('6.00'), {'6.0': 1})
+    assert 'albums: 1 updated' in output.getvalue()
+
+
+@pytest.mark.django_db
+def test_cascading_deletes_update_rating_aggregates(album, band, review, user):
+    other = Label.objects.create(
+        name='Nuclear Blast', address='x', country='Germany', status=1, styles='metal',
+        founding_year=1987, added_by=user,
+    )
+    guest = Band.objects.create(
+        name='Metallica', country_of_origin='USA', status=1, formed_in=1981, current_label=other, added_by=user,
+    )
+    split = Album.objects.create(
+        title='Split', band=guest, type=1, catalog_id='x', label=album.label, format=1, added_by=user,
+    )
+    Review.objects.create(subject='x', album=split, band=guest, rating=4, description='x', user=user)
+    guest.refresh_from_db()
+    assert guest.rating_count == 0
+
+    call_command('rebuild_ratings', stdout=StringIO())
+    guest.refresh_from_db()
+    assert guest.rating_histogram == {'4.0': 1}
+
+    # the label of the split album goes, and with it the review of the other band
+    album.label.delete()
+    guest.refresh_from_db()
+    assert (guest.rating_count, guest.rating_mean, guest.rating_histogram) == (0, None, {})
+
+
+HOT_QUERIES = [
+    (lambda: Band.objects.order_by('name'), 'band_name_idx'),
+    (lambda: Genre.objects.order_by('name'), 'genre_name_idx'),
+    (lambda: Label.objects.order_by('name'), 'label_name_idx'),
+    (lambda: Album.objects.order_by('-added'), 'album_added_idx'),
+    (lambda: Review.objects.order_by('-added'), 'review_added_idx'),
+    (lambda: Album.objects.filter(band_id=1).order_by('release_date'), 'album_band_release_idx'),
+    (lambda: Album.objects.filter(title='Ride the Lightning'), 'album_title_idx'),
+    (lambda: Label.objects.filter(name='Metal Blade'), 'label_name_idx'),
+    (lambda: Genre.objects.filter(name='thrash metal'), 'genre_name_idx'),
+    (lambda: Musician.objects.filter(name='Nergal'), 'musician_name_idx'),
+    (lambda: Musician.objects.filter(full_name='Adam Darski'), 'musician_full_name_idx'),
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('query, index', HOT_QUERIES)
+def test_hot_queries_use_indexes(query, index):
+    assert index in query().explain()
+
+
+def make_bands(names, label, user):
+    return Band.objects.bulk_create([
+        Band(name=name, country_of_origin='x', location='x', status=1, formed_in=1990,
+             lyrical_themes='x', current_label=label, bio='x', added_by=user)
+        for name in names
+    ])
+
+
+@pytest.mark.django_db
+def test_search_ranks_fts_matches(label, user):
+    make_bands(['Iron Maiden', 'Maiden United', 'Iron Savior', 'Metallica'], label, user)
+    backend = get_search_backend()
+    assert isinstance(backend, SQLiteSearchBackend)
+    assert 'bm25' in str(backend.search('maiden').query)
+    assert set(backend.search('maiden').values_list('name', flat=True)) == {'Iron Maiden', 'Maiden United'}
+    assert list(backend.search('iron maid').values_list('name', flat=True)) == ['Iron Maiden']
+    ranks = list(backend.search('iron').values_list('rank', flat=True))
+    assert len(ranks) == 2 and None not in ranks and ranks == sorted(ranks)
+    assert list(backend.search('al"ica').values_list('name', flat=True)) == []
+
+
+@pytest.mark.django_db
+def test_search_index_follows_band_changes(band):
+    backend = get_search_backend()
+    band.name = 'Judas Priest'
+    band.save()
+    assert list(backend.search('priest')) == [band]
+    assert list(backend.search('maiden')) == []
+    band.delete()
+    assert list(backend.search('priest')) == []
+
+
+@pytest.mark.django_db
+def test_search_short_terms_fall_back_to_substring(label, user):
+    make_bands(['U2', 'UFO', 'Iron Maiden'], label, user)
+    assert list(get_search_backend().search('u2').values_list('name', flat=True)) == ['U2']
+
+
+@pytest.mark.django_db
+def test_search_band_view_paginates(client, label, user):
+    make_bands([f'Metal Band {i:02}' for i in range(25)], label, user)
+    response = client.get('/searching-results/', {'query': 'metal'})
+    assert len(response.context['band']) == 10
+    assert response.context['page_obj'].paginator.count == 25
+    assert '?query=metal&page=2' in response.content.decode()
+    response = client.get('/searching-results/', {'query': 'metal', 'page': 3})
+    assert len(response.context['band']) == 5
+    response = client.get('/searching-results/', {'query': 'nothing'})
+    assert response.context['message'] == 'No results'
+
+
+@pytest.mark.django_db
+def test_counters_follow_writes(client, user, band, label, genre, musician):
+    call_command('rebuild_counters', stdout=StringIO())
+    other_label = Label.objects.create(
+        name='Nuclear Blast', address='x', country='Germany', status=1, styles='metal',
+        founding_year=1987, added_by=user,
+    )
+    counted = counted_state(band)
+    band.current_label = other_label
+    band.save()
+    update_counters(Band, added=[band], removed=[counted])
+    band.genre.add(genre)
+    genre.album_set.add(Album.objects.create(
+        title='Killers', band=band, type=1, catalog_id='x', label=label, format=1, added_by=user,
+    ))
+    for role in ('guitar', 'vocal'):
+        update_counters(MusicianBand, added=[MusicianBand.objects.create(musician=musician, band=band, role=role)])
+
+    for obj in (band, label, other_label, genre, musician):
+        obj.refresh_from_db()
+    assert (label.band_count, other_label.band_count) == (0, 1)
+    assert (genre.band_count, genre.album_count) == (1, 1)
+    assert musician.band_count == 1
+
+    band.genre.remove(genre)
+    genre.refresh_from_db()
+    assert genre.band_count == 0
+
+    client.force_login(user)
+    client.get(f'/band/delete/{band.id}/')
+    for obj in (other_label, genre, musician):
+        obj.refresh_from_db()
+    assert other_label.band_count == genre.album_count == musician.band_count == 0
+
+
+@pytest.mark.django_db
+def test_rebuild_counters_command(album, genre, musician_to_band):
+    Band.objects.update(album_count=5)
+    output = StringIO()
+    call_command('rebuild_counters', stdout=output)
+    band = Band.objects.get()
+    assert (band.album_count, band.current_label.band_count) == (1, 1)
+    assert Musician.objects.get().band_count == 1
+    assert 'bands album_count: 1 updated' in output.getvalue()
+
+    output = StringIO()
+    call_command('rebuild_counters', stdout=output)
+    assert ': 1 updated' not in output.getvalue()
+
+
+@pytest.mark.django_db
+def test_import_catalog_command(tmp_path, user, genre):
+    labels = tmp_path / 'labels.csv'
+    labels.write_text(
+        'name,address,country,status,styles,founding_year\n'
+        'Metal Blade,Agoura Hills,USA,active,metal,1982\n'
+        'Noise,Berlin,Germany,9,metal,1983\n'
+    )
+    bands = tmp_path / 'bands.ndjson'
+    bands.write_text('\n'.join(json.dumps({
+        'name': name, 'country_of_origin': 'USA', 'location': 'LA', 'status': 'active', 'formed_in': 1981,
+        'ended_in': None, 'lyrical_themes': 'x', 'bio': None, 'current_label': 'Metal Blade', 'genre': ['rock'],
+    }) for name in ('Slayer', 'Metallica', 'Armored Saint')))
+    albums = tmp_path / 'albums.json'
+    albums.write_text(json.dumps([
+        {'title': 'Hell Awaits', 'band': 'Slayer', 'label': 'Metal Blade', 'genre': 'rock', 'type': 1,
+         'release_date': '1985-03-01', 'catalog_id': 'MBR 1054', 'format': 'vinyl'},
+    ]))
+
+    errors = StringIO()
+    call_command('import_catalog', 'labels', str(labels), user=user.username, stdout=StringIO(), stderr=errors)
+    assert list(Label.objects.values_list('name', flat=True)) == ['Metal Blade']
+    assert 'row 2: status:' in errors.getvalue()
+
+    output = StringIO()
+    call_command('import_catalog', 'bands', str(bands), user=user.username, batch_size=2, stdout=output)
+    call_command('import_catalog', 'albums', str(albums), user=user.username, stdout=StringIO())
+    assert 'bands: 3 created, 0 updated, 0 unchanged, 0 invalid' in output.getvalue()
+    assert not (tmp_path / 'bands.ndjson.import-state').exists()
+    genre.refresh_from_db()
+    assert (genre.band_count, genre.album_count) == (3, 1)
+    assert Label.objects.get().band_count == 3
+    assert Band.objects.get(name='Slayer').album_count == 1
+    assert Album.objects.get().format == 2
+
+    # an interrupted import continues after its last committed batch
+    (tmp_path / 'bands.ndjson.import-state').write_text(json.dumps({
+        'kind': 'bands', 'size': bands.stat().st_size, 'mtime': bands.stat().st_mtime, 'position': 2,
+    }))
+    output = StringIO()
+    call_command('import_catalog', 'bands', str(bands), user=user.username, resume=True, stdout=output)
+    assert 'bands: 0 created, 0 updated, 1 unchanged' in output.getvalue()
+    assert Band.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_import_catalog_updates_changed_fields(tmp_path, user, band, label, genre, settings):
+    other_label = Label.objects.create(
+        name='Nuclear Blast', address='x', country='Germany', status=1, styles='metal',
+        founding_year=1987, added_by=user,
+    )
+    call_command('rebuild_counters', stdout=StringIO())
+    row = {
+        'name': band.name, 'country_of_origin': 'England', 'location': band.location, 'status': 'active',
+        'formed_in': 1975, 'lyrical_themes': band.lyrical_themes, 'bio': band.bio,
+        'current_label': 'Nuclear Blast', 'genre': ['rock'],
+    }
+    bands = tmp_path / 'bands.ndjson'
+    bands.write_text(json.dumps(row))
+    settings.IMPORT_NATURAL_KEYS = {'bands': ('name',)}
+
+    output = StringIO()
+    call_command('import_catalog', 'bands', str(bands), user=user.username, update=True, stdout=output)
+    assert 'bands: 0 created, 1 updated, 0 unchanged' in output.getvalue()
+    band.refresh_from_db()
+    assert (band.country_of_origin, band.current_label_id) == ('England', other_label.id)
+    assert list(band.genre.all()) == [genre]
+    label.refresh_from_db()
+    other_label.refresh_from_db()
+    genre.refresh_from_db()
+    assert (label.band_count, other_label.band_count, genre.band_count) == (0, 1, 1)
+
+    output = StringIO()
+    call_command('import_catalog', 'bands', str(bands), user=user.username, update=True, stdout=output)
+    assert 'bands: 0 created, 0 updated, 1 unchanged' in output.getvalue()
+
+    # relations missing from the input are left as they are
+    del row['genre']
+    row['country_of_origin'] = 'Great Britain'
+    bands.write_text(json.dumps(row))
+    call_command('import_catalog', 'bands', str(bands), user=user.username, update=True, stdout=StringIO())
+    assert Band.objects.get().genre.count() == 1
+
+    # without the key setting the row is a band of another country
+    settings.IMPORT_NATURAL_KEYS = {}
+    row['country_of_origin'] = 'Scotland'
+    bands.write_text(json.dumps(row))
+    call_command('import_catalog', 'bands', str(bands), user=user.username, update=True, stdout=StringIO())
+    assert Band.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_large_label_delete_runs_in_background(
+    client, user, label, band, album, review, musician_to_band, genre, settings
+):
+    settings.DELETE_SYNC_LIMIT = 2
+    band.genre.add(genre)
+    album.genre.add(genre)
+    call_command('rebuild_counters', stdout=StringIO())
+    client.force_login(user)
+
+    client.get(f'/label/delete/{label.id}/')
+    job = DeletionJob.objects.get()
+    assert not Label.objects.exists()
+    assert Label.all_objects.get().hidden
+    assert (job.status, job.total) == (1, 5)
+    # the rows the job will delete are hidden at once
+    assert not (Band.objects.exists() or Album.objects.exists() or Review.objects.exists())
+    assert not MusicianBand.objects.exists()
+    assert client.get(f'/album/details/{album.id}/').status_code == 404
+    assert client.get(f'/band/details/{band.id}/').status_code == 404
+
+    output = StringIO()
+    call_command('run_deletions', chunk_size=1, stdout=output)
+    job.refresh_from_db()
+    assert (job.status, job.deleted) == (3, 5)
+    assert '5 rows deleted' in output.getvalue()
+    assert not Label.all_objects.exists()
+    assert not Band.all_objects.exists()
+    assert not (Album.objects.exists() or Review.objects.exists() or MusicianBand.objects.exists())
+    genre.refresh_from_db()
+    assert (genre.band_count, genre.album_count) == (0, 0)
+    assert Musician.objects.get().band_count == 0
+
+
+@pytest.mark.django_db
+def test_small_band_delete_is_immediate(client, user, band, settings):
+    settings.DELETE_SYNC_LIMIT = 1
+    client.force_login(user)
+    client.get(f'/band/delete/{band.id}/')
+    assert not Band.all_objects.exists()
+    assert not DeletionJob.objects.exists()
+
+
+@pytest.mark.django_db
+def test_hidden_band_pages_return_404(client, user, band, album, settings):
+    settings.DELETE_SYNC_LIMIT = 1
+    client.force_login(user)
+    assert client.get(f'/band/delete/{band.id}/').status_code == 302
+    assert Band.all_objects.get().hidden
+    # a repeated click while the job runs
+    assert client.get(f'/band/delete/{band.id}/').status_code == 404
+    assert DeletionJob.objects.count() == 1
+    assert client.get(f'/band/delete/confirm/{band.id}/').status_code == 404
+    assert client.post(f'/band/update/{band.id}/', {'name': 'x'}).status_code == 404
+    assert client.get(f'/album/delete/confirm/{album.id}/').status_code == 404
+
+
+@pytest.mark.django_db
+def test_deletes_update_counters_once_per_change(user, label, band, genre):
+    albums = [
+        Album.objects.create(title=f'Album {number}', band=band, type=1, catalog_id='x', label=label, format=1,
+                             added_by=user)
+        for number in range(5)
+    ]
+    for album in albums:
+        album.genre.add(genre)
+        Review.objects.create(subject='x', album=album, band=band, rating=5, description='x', user=user)
+    call_command('rebuild_counters', stdout=StringIO())
+    call_command('rebuild_ratings', stdout=StringIO())
+
+    with CaptureQueriesContext(connection) as context:
+        deletion.delete(band)
+    writes = [query['sql'] for query in context.captured_queries if query['sql'].startswith(('UPDATE', 'INSERT'))]
+    assert sum('UPDATE "music_app_genre"' in sql for sql in writes) == 1
+    assert sum('UPDATE "music_app_label"' in sql for sql in writes) == 1
+    # one per deleted model, the band, its albums and their reviews
+    assert sum('INSERT INTO "api_tombstone"' in sql for sql in writes) == 3
+    genre.refresh_from_db()
+    label.refresh_from_db()
+    assert (genre.album_count, label.band_count) == (0, 0)
@@ -1,11 +1,34 @@
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
-from music_app import forms
+from music_app import deletion, forms
+from music_app.conditional import conditional_get, signature
+from music_app.counters import counted_state, update_counters
 from music_app.models import Band, Genre, Musician, Label, Album, MusicianBand, Review
+from music_app.ratings import review_ratings, update_ratings
+from music_app.search import get_search_backend
+
+
+def band_details_signatures(request, _id):
+    return [
+        signature(Band.objects.filter(pk=_id), 'modified', 'current_label__modified'),
+        signature(Album.objects.filter(band_id=_id)),
+        signature(MusicianBand.objects.filter(band_id=_id), 'modified', 'musician__modified'),
+        # linking and unlinking genres bumps their modified, see music_app.counters
+        signature(Genre.objects.filter(band=_id)),
+    ]
+
+
+def album_details_signatures(request, album_id):
+    return [
+        signature(Album.objects.filter(pk=album_id), 'modified', 'band__modified', 'label__modified'),
+        signature(Genre.objects.filter(album=album_id)),
+    ]
 
 
 class LandingPageView(View):
@@ -165,6 +188,7 @@ class BandsListAlphabeticalView(View):
     This function display list of all bands in database in
     alphabetical order.
     """
+    @conditional_get(lambda request: [signature(Band.objects.all())])
     def get(self, request):
         bands = Band.objects.all().order_by('name')
         paginator = Paginator(bands, 10)
@@ -201,6 +225,7 @@ class BandsGenresListView(View):
 
 class BandsListByGenreView(View):
     """This function display list of bands by genres."""
+    @conditional_get(lambda request, _id: [signature(Band.objects.filter(genre=_id))])
     def get(self, request, _id):
         bands = Band.objects.filter(genre=_id).order_by('name')
         paginator = Paginator(bands, 10)
@@ -251,18 +276,20 @@ class BandCreateView(LoginRequiredMixin, View):
             lyrical_themes = data.get('lyrical_themes')
             current_label = data.get('current_label')
             bio = data.get('bio')
-            label_id = Label.objects.get(id=current_label)
-
-            band = Band.objects.create(name=name,
-                                       country_of_origin=country_of_origin,
-                                       location=location,
-                                       status=status,
-                                       formed_in=formed_in,
-                                       lyrical_themes=lyrical_themes,
-                                       current_label=label_id,
-                                       bio=bio,
-                                       added_by=request.user)
-            band.genre.set(genre)
+            label_id = get_object_or_404(Label, id=current_label)
+
+            with transaction.atomic():
+                band = Band.objects.create(name=name,
+                                           country_of_origin=country_of_origin,
+                                           location=location,
+                                           status=status,
+                                           formed_in=formed_in,
+                                           lyrical_themes=lyrical_themes,
+                                           current_label=label_id,
+                                           bio=bio,
+                                           added_by=request.user)
+                band.genre.set(genre)
+                update_counters(Band, added=[band])
 
             return redirect(f'/band/details/{band.id}/')
 
@@ -277,8 +304,9 @@ class BandCreateView(LoginRequiredMixin, View):
 
 class BandDetailsView(View):
     """This function display all data about specific band."""
+    @conditional_get(band_details_signatures)
     def get(self, request, _id):
-        band = Band.objects.get(pk=_id)
+        band = get_object_or_404(Band, pk=_id)
         musicians = MusicianBand.objects.filter(band_id=_id)
         genres = Genre.objects.filter(band=_id)
         albums = Album.objects.filter(band_id=_id).order_by('release_date')
@@ -326,7 +354,7 @@ class BandUpdateView(LoginRequiredMixin, View):
 
     def post(self, request, _id):
         """This function save updated data about band to database."""
-        band = Band.objects.get(id=_id)
+        band = get_object_or_404(Band, id=_id)
         form = forms.BandCreateForm(request.POST)
 
         if form.is_valid():
@@ -341,8 +369,9 @@ class BandUpdateView(LoginRequiredMixin, View):
             lyrical_themes = data.get('lyrical_themes')
             current_label = data.get('current_label')
             bio = data.get('bio')
-            label_id = Label.objects.get(id=current_label)
+            label_id = get_object_or_404(Label, id=current_label)
 
+            counted = counted_state(band)
             band.name = name
             band.country_of_origin = country_of_origin
             band.location = location
@@ -352,8 +381,10 @@ class BandUpdateView(LoginRequiredMixin, View):
             band.current_label = label_id
             band.bio = bio
             band.added_by = request.user
-            band.genre.set(genre)
-            band.save()
+            with transaction.atomic():
+                band.genre.set(genre)
+                band.save()
+                update_counters(Band, added=[band], removed=[counted])
 
             return redirect(f'/band/details/{_id}/')
 
@@ -373,9 +404,10 @@ class BandDeleteView(LoginRequiredMixin, View):
     def get(self, request, _id):
         """
         This function delete band data from database.
+        Bands with many albums are hidden and deleted in the background.
         Only for logged users.
         """
-        Band.objects.get(pk=_id).delete()
+        deletion.delete(get_object_or_404(Band, pk=_id), user=request.user)
 
         return redirect('/')
 
@@ -389,7 +421,7 @@ class BandDeleteConfirmView(LoginRequiredMixin, View):
         band data from database.
         Only for logged users.
         """
-        band = Band.objects.get(pk=_id)
+        band = get_object_or_404(Band, pk=_id)
         return render(
             request,
             'band_delete_confirm.html',
@@ -637,9 +669,10 @@ class LabelCreateView(LoginRequiredMixin, View):
 
 
 class LabelDetailsView(View):
+    @conditional_get(lambda request, _id: [signature(Label.objects.filter(pk=_id))])
     def get(self, request, _id):
         """This function display all details about specific label."""
-        label = Label.objects.get(pk=_id)
+        label = get_object_or_404(Label, pk=_id)
 
         return render(
             request,
@@ -677,7 +710,7 @@ class LabelUpdateView(LoginRequiredMixin, View):
 
     def post(self, request, _id):
         """This function save updated label data to database."""
-        label = Label.objects.get(pk=_id)
+        label = get_object_or_404(Label, pk=_id)
         form = forms.LabelCreateForm(request.POST)
 
         if form.is_valid():
@@ -711,6 +744,7 @@ class LabelUpdateView(LoginRequiredMixin, View):
 
 
 class LabelListView(View):
+    @conditional_get(lambda request: [signature(Label.objects.all())])
     def get(self, request):
         """
         This function display list of all labels in database
@@ -737,9 +771,10 @@ class LabelDeleteView(LoginRequiredMixin, View):
     def get(self, request, _id):
         """
         This function delete specific label from database.
+        Labels with many bands are hidden and deleted in the background.
         Only for logged users.
         """
-        Label.objects.get(id=_id).delete()
+        deletion.delete(get_object_or_404(Label, id=_id), user=request.user)
 
         return redirect('/')
 
@@ -753,7 +788,7 @@ class LabelDeleteConfirmView(LoginRequiredMixin, View):
         before delete specific label from database.
         Only for logged users.
         """
-        label = Label.objects.get(id=_id)
+        label = get_object_or_404(Label, id=_id)
         return render(
             request,
             'label_delete_confirm.html',
@@ -764,6 +799,7 @@ class LabelDeleteConfirmView(LoginRequiredMixin, View):
 
 
 class AlbumLastAddedView(View):
+    @conditional_get(lambda request: [signature(Album.objects.all(), 'modified', 'band__modified')])
     def get(self, request):
         """
         This function display list of all albums
@@ -785,9 +821,10 @@ class AlbumLastAddedView(View):
 
 
 class AlbumDetailsView(View):
+    @conditional_get(album_details_signatures)
     def get(self, request, album_id):
         """This function display all data about specific album."""
-        album = Album.objects.get(pk=album_id)
+        album = get_object_or_404(Album, pk=album_id)
         return render(
             request,
             'album_details.html',
@@ -830,8 +867,8 @@ class AlbumCreateView(LoginRequiredMixin, View):
             label = data.get('label')
             format_music = data.get('format')
 
-            label_id = Label.objects.get(id=label)
-            band_id = Band.objects.get(id=band)
+            label_id = get_object_or_404(Label, id=label)
+            band_id = get_object_or_404(Band, id=band)
 
             if Album.objects.filter(title=title).exists():
                 message = 'This album already exists in database!'
@@ -844,18 +881,20 @@ class AlbumCreateView(LoginRequiredMixin, View):
                     }
                 )
 
-            album = Album.objects.create(
-                title=title,
-                band=band_id,
-                type=type_record,
-                release_date=release_date,
-                catalog_id=catalog_id,
-                label=label_id,
-                format=format_music,
-                added_by=request.user
-            )
+            with transaction.atomic():
+                album = Album.objects.create(
+                    title=title,
+                    band=band_id,
+                    type=type_record,
+                    release_date=release_date,
+                    catalog_id=catalog_id,
+                    label=label_id,
+                    format=format_music,
+                    added_by=request.user
+                )
 
-            album.genre.set(genre)
+                album.genre.set(genre)
+                update_counters(Album, added=[album])
 
             return redirect(f'/album/details/{album.id}/')
 
@@ -899,7 +938,7 @@ class AlbumUpdateView(LoginRequiredMixin, View):
 
     def post(self, request, _id):
         """This function save updated album data to database."""
-        album = Album.objects.get(pk=_id)
+        album = get_object_or_404(Album, pk=_id)
         form = forms.AlbumCreateForm(request.POST)
 
         if form.is_valid():
@@ -914,9 +953,10 @@ class AlbumUpdateView(LoginRequiredMixin, View):
             label = data.get('label')
             format = data.get('format')
 
-            band_id = Band.objects.get(id=band)
-            label_id = Label.objects.get(id=label)
+            band_id = get_object_or_404(Band, id=band)
+            label_id = get_object_or_404(Label, id=label)
 
+            counted = counted_state(album)
             album.title = title
             album.band = band_id
             album.type = type_record
@@ -925,8 +965,10 @@ class AlbumUpdateView(LoginRequiredMixin, View):
             album.label = label_id
             album.format = format
             album.added_by = request.user
-            album.genre.set(genre)
-            album.save()
+            with transaction.atomic():
+                album.genre.set(genre)
+                album.save()
+                update_counters(Album, added=[album], removed=[counted])
 
             return redirect('/')
 
@@ -948,7 +990,7 @@ class AlbumDeleteView(LoginRequiredMixin, View):
         This function delete album from database.
         Only for logged users.
         """
-        Album.objects.get(id=_id).delete()
+        get_object_or_404(Album, id=_id).delete()
 
         return redirect('/')
 
@@ -962,7 +1004,7 @@ class AlbumDeleteConfirmView(LoginRequiredMixin, View):
         before delete specific album from database.
         Only for logged users.
         """
-        album = Album.objects.get(id=_id)
+        album = get_object_or_404(Album, id=_id)
         return render(
             request,
             'album_delete_confirm.html',
@@ -1111,8 +1153,8 @@ class ReviewCreateView(LoginRequiredMixin, View):
         This function display a form to create album review.
         Only for logged users.
         """
-        album = Album.objects.get(pk=album_id)
-        band = Band.objects.get(pk=band_id)
+        album = get_object_or_404(Album, pk=album_id)
+        band = get_object_or_404(Band, pk=band_id)
         form = forms.ReviewCreateForm()
 
         return render(
@@ -1127,8 +1169,8 @@ class ReviewCreateView(LoginRequiredMixin, View):
 
     def post(self, request, album_id, band_id):
         """This form save album review data to database."""
-        album = Album.objects.get(pk=album_id)
-        band = Band.objects.get(pk=band_id)
+        album = get_object_or_404(Album, pk=album_id)
+        band = get_object_or_404(Band, pk=band_id)
         form = forms.ReviewCreateForm(request.POST)
         if form.is_valid():
             data = form.cleaned_data
@@ -1139,14 +1181,16 @@ class ReviewCreateView(LoginRequiredMixin, View):
             rating = data.get('rating')
             description = data.get('description')
 
-            Review.objects.create(
-                subject=subject,
-                album_id=title,
-                band_id=band_name,
-                rating=rating,
-                description=description,
-                user=request.user
-            )
+            with transaction.atomic():
+                review = Review.objects.create(
+                    subject=subject,
+                    album_id=title,
+                    band_id=band_name,
+                    rating=rating,
+                    description=description,
+                    user=request.user
+                )
+                update_ratings(added=review_ratings([review]))
 
             return redirect(f'/band/details/{band_id}')
 
@@ -1196,13 +1240,15 @@ class AddMusicianToBand(LoginRequiredMixin, View):
             year_to = data.get('year_to')
             role = data.get('role')
 
-            MusicianBand.objects.create(
-                musician_id=musician,
-                band_id=band,
-                year_from=year_from,
-                year_to=year_to,
-                role=role
-            )
+            with transaction.atomic():
+                musician_band = MusicianBand.objects.create(
+                    musician_id=musician,
+                    band_id=band,
+                    year_from=year_from,
+                    year_to=year_to,
+                    role=role
+                )
+                update_counters(MusicianBand, added=[musician_band])
 
             return redirect('add-board')
 
@@ -1224,7 +1270,7 @@ class DeleteMusicianFromBandView(LoginRequiredMixin, View):
         This function delete musician data from band.
         Only for logged users.
         """
-        MusicianBand.objects.get(id=_id).delete()
+        get_object_or_404(MusicianBand, id=_id).delete()
 
         return redirect('/')
 
@@ -1238,7 +1284,7 @@ class DeleteMusicianFromBandConfirmView(LoginRequiredMixin, View):
         before delete musician from band.
         Only for logged users.
         """
-        musician = MusicianBand.objects.get(id=_id)
+        musician = get_object_or_404(MusicianBand, id=_id)
         return render(
             request,
             'musician_band_delete_confirm.html',
@@ -1271,7 +1317,7 @@ class ReviewsListView(View):
 class ReviewDetailsView(View):
     def get(self, request, _id):
         """This function display all details about specific review."""
-        review = Review.objects.get(pk=_id)
+        review = get_object_or_404(Review, pk=_id)
 
         return render(
             request,
@@ -1310,7 +1356,7 @@ class ReviewUpdateView(LoginRequiredMixin, View):
         This form save updated review data to database.
         Only for logged users.
         """
-        review = Review.objects.get(pk=_id)
+        review = get_object_or_404(Review, pk=_id)
         form = forms.ReviewCreateForm(request.POST)
 
         if form.is_valid():
@@ -1321,11 +1367,14 @@ class ReviewUpdateView(LoginRequiredMixin, View):
             rating = data.get('rating')
             user = request.user
 
-            review.subject = subject
-            review.description = description
-            review.rating = rating
-            review.user = user
-            review.save()
+            with transaction.atomic():
+                removed = review_ratings([review])
+                review.subject = subject
+                review.description = description
+                review.rating = rating
+                review.user = user
+                review.save()
+                update_ratings(added=review_ratings([review]), removed=removed)
 
             return redirect('reviews-list')
 
@@ -1347,7 +1396,7 @@ class ReviewDeleteView(LoginRequiredMixin, View):
         This function delete review data from database.
         Only for logged users.
         """
-        Review.objects.get(id=_id).delete()
+        get_object_or_404(Review, id=_id).delete()
 
         return redirect('reviews-list')
 
@@ -1361,7 +1410,7 @@ class ReviewDeleteConfirmView(LoginRequiredMixin, View):
         before delete review data from database.
         Only for logged users.
         """
-        review = Review.objects.get(id=_id)
+        review = get_object_or_404(Review, id=_id)
         return render(
             request,
             'review_delete_confirm.html',
@@ -1383,21 +1432,24 @@ class AddMusicDataView(LoginRequiredMixin, View):
 
 
 def search_band(request):
-    """This function searching a band by name."""
-    band = Band.objects.all()
-    searching_band = request.GET['query']
+    """
+    This function searching a band by name,
+    best matches first.
+    """
+    searching_band = request.GET['query'].strip()
 
     if searching_band:
-        band = Band.objects.filter(name__icontains=searching_band)
+        results = get_search_backend().search(searching_band)
+        paginator = Paginator(results[:getattr(settings, 'SEARCH_MAX_RESULTS', 1000)], 10)
+        page_obj = paginator.get_page(request.GET.get('page'))
 
-        if not band:
+        if not paginator.count:
             message = "No results"
 
             return render(
                 request,
                 'searching-results.html',
                 context={
-                    'band': band,
                     'message': message
                 }
             )
@@ -1406,9 +1458,11 @@ def search_band(request):
             request,
             'searching-results.html',
             context={
-                'band': band,
+                'band': page_obj,
+                'page_obj': page_obj,
+                'query': searching_band,
             }
-        ),
+        )
 
     return render(
         request,